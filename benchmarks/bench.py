@@ -0,0 +1,269 @@
+'''benchmarks of the company methods, the ATKR pipeline of the README and
+batch runs of the universe runner
+
+Every case is timed over a number of repeats and run once more under
+tracemalloc for the peak memory and the net number of allocated blocks.
+The results can be saved as a baseline and compared with a later run.
+
+usage:
+    python benchmarks/bench.py                        # run and print
+    python benchmarks/bench.py --save baseline.json   # store a baseline
+    python benchmarks/bench.py --compare baseline.json
+    python benchmarks/bench.py --years 10 --batch 1 100 --repeat 3
+    python benchmarks/bench.py --years 10 --batch 1 --quarters 400
+'''
+import argparse
+import copy
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+import finagle as cmp
+from finagle import universe
+
+
+def atkr_spec(year=10):
+    '''spec of the ATKR example in the README, the yearly lists are extended
+    to the year of the forecast and the acquisitions continue until the year
+    before the final year (or year 9)
+
+    Args:
+        year: final forecast year
+
+    Returns:
+        spec: a spec for universe.run_spec()
+    '''
+    financials = {
+        'date': '2021-9-30',
+        'ebitda': [881],
+        'capex': [64, 90, 90, 90],
+        'dwc': [0, 448.5] + [0]*(year-1),
+        'sbc': [0]*(year+1),
+        'tax': [192],
+        'da': [79, 79],
+        'debt': [759]*(year+1),
+        'interest': [33],
+        'cash': 390.4,
+        'nol': 0,
+        'noa': 0,
+    }
+    fracs = [0.0157, 0.0227, 0.0315] + [0.03]*6
+    steps = [
+        ['forecast_ebitda', {'ebitda_ttm': 881, 'gf': [0.4756, -0.3233, -0.3096, 0.10]}],
+        ['forecast_capex', {'capex_f': [64, 90, 90, 90]}],
+        'load_financials',
+        'fcf_from_ebitda',
+    ]
+    for year_a in range(1, min(len(fracs), year-1)+1):
+        steps.append(['fcf_to_acquire', {'year_a': year_a, 'ebitda_frac': fracs[year_a-1], 'multiple': 6.5,
+                                         'leverage': 0, 'gnext': 0.1, 'cap_frac': 0.12, 'adjust_cash': False}])
+    steps += [
+        ['fcf_to_debt', {'leverage': 2, 'year_d': 3}],
+        ['fcf_to_allocate', {'price': 113, 'dp': 'constant', 'buybacks': [0.0, 500, 500, 500, 0]}],
+        'value',
+    ]
+    return {
+        'ticker': 'ATKR',
+        'args': {'rd': 0.05, 're': 0.09, 't': 0.21, 'shares': 46, 'gt': 0.02, 'roict': 0.17,
+                 'year': year, 'dividend': [0]},
+        'financials': financials,
+        'steps': steps,
+    }
+
+
+def _upto(spec, name):
+    '''the spec with the steps before the first call of a method
+
+    Returns:
+        spec, kwargs: the truncated spec and the arguments of the method
+    '''
+    spec = copy.deepcopy(spec)
+    steps = [[step, {}] if isinstance(step, str) else step for step in spec['steps']]
+    names = [step[0] for step in steps]
+    i = names.index(name)
+    spec['steps'] = steps[:i]
+    return spec, steps[i][1]
+
+
+def _build(spec):
+    '''build a company from the steps of a spec, without running value()
+
+    Returns:
+        c, financials: the company and the financials dict of the spec
+    '''
+    spec = copy.deepcopy(spec)
+    c = cmp.company(**dict(spec['args'], ticker=spec['ticker']))
+    financials = spec['financials']
+    for name, kwargs in spec['steps']:
+        kwargs = dict(kwargs)
+        if name in ['forecast_ebitda', 'forecast_capex', 'load_financials']:
+            kwargs['financials'] = financials.copy() if name == 'load_financials' else financials
+        getattr(c, name)(**kwargs)
+    return c, financials
+
+
+def method_cases(year):
+    '''a case for each public method, the company is built by the steps
+    before the method, which aren't timed
+
+    Returns:
+        cases: dict of name to (setup, call), setup returns the argument
+        of call
+    '''
+    spec = atkr_spec(year)
+    cases = {}
+
+    def pipeline_case(name):
+        partial, kwargs = _upto(spec, name)
+
+        def call(state):
+            c, financials = state
+            kw = dict(kwargs)
+            if name in ['forecast_ebitda', 'forecast_capex', 'load_financials']:
+                kw['financials'] = financials.copy() if name == 'load_financials' else financials
+            getattr(c, name)(**kw)
+        return (lambda: _build(partial)), call
+
+    for name in ['forecast_ebitda', 'forecast_capex', 'load_financials', 'fcf_from_ebitda',
+                 'fcf_to_acquire', 'fcf_to_debt', 'fcf_to_allocate', 'value']:
+        cases[name] = pipeline_case(name)
+
+    def valued():
+        return universe.run_spec(spec)
+
+    allocate = _upto(spec, 'fcf_to_allocate')[0]
+    cases['fcf_to_buyback'] = (lambda: _build(allocate)[0], lambda c: c.fcf_to_buyback(price=113, dp='constant'))
+    cases['noa_to_dispose'] = (valued, lambda c: c.noa_to_dispose(5, year_dis=year//2))
+    cases['value_batch'] = (valued, lambda c: c.value_batch(re=[0.08, 0.09, 0.1], gt=[0.01, 0.02, 0.03],
+                                                           grid=True))
+    cases['sensitivity'] = (valued, lambda c: c.sensitivity('multiple', range(4, 24), 'leverage', range(20)))
+    cases['implied_growth'] = (valued, lambda c: c.implied_growth([100, 150, 200]))
+    cases['simulate'] = (valued, lambda c: c.simulate([0.4756, -0.3233, -0.3096, 0.10], n=10000, seed=0))
+    return cases
+
+
+def measure(setup, call, repeat):
+    '''time a call and measure its memory use
+
+    Args:
+        setup: function returning the argument of call, not timed
+        call: function of the state which is measured
+        repeat: number of timed calls
+
+    Returns:
+        result: dict with the best and mean seconds per call, the peak memory
+        in kB and the net number of allocated blocks
+    '''
+    times = []
+    for i in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        call(state)
+        times.append(time.perf_counter()-start)
+
+    state = setup()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    call(state)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks()-blocks
+    return {'best': min(times), 'mean': sum(times)/len(times), 'peak_kb': peak/1024,
+            'blocks': blocks}
+
+
+def run(years, batches, repeat, workers, quarters=()):
+    '''run all the benchmarks
+
+    Args:
+        years: final forecast years of the method cases and the pipeline
+        batches: numbers of specs of the universe runs
+        repeat: number of timed calls of each case
+        workers: workers of the universe runs
+        quarters: final forecast quarters of the quarterly pipeline
+
+    Returns:
+        results: dataframe indexed by the name of the case
+    '''
+    cmp.silent()
+    results = {}
+    for year in years:
+        for name, (setup, call) in method_cases(year).items():
+            results['{}[year={}]'.format(name, year)] = measure(setup, call, repeat)
+        spec = atkr_spec(year)
+        results['pipeline[year={}]'.format(year)] = measure(lambda: spec, universe.run_spec, repeat)
+    for year in quarters:
+        spec = atkr_spec(year)
+        spec['args']['period'] = 'quarterly'
+        results['pipeline[quarters={}]'.format(year)] = measure(lambda: spec, universe.run_spec, repeat)
+    for n in batches:
+        specs = [dict(atkr_spec(10), ticker='T{}'.format(i)) for i in range(n)]
+        results['run_universe[n={}]'.format(n)] = measure(
+            lambda: specs, lambda s: universe.run_universe(s, workers=workers), 1 if n > 100 else repeat)
+    cmp.silent(False)
+    return pd.DataFrame(results).T
+
+
+def compare(results, baseline, threshold):
+    '''compare the best times with a baseline, which are the least noisy
+
+    Args:
+        results: dataframe of this run
+        baseline: dataframe of the baseline run
+        threshold: ratio of the times above which a case is reported as a
+        regression
+
+    Returns:
+        report: dataframe with the times of both runs and their ratio
+    '''
+    report = pd.DataFrame({'baseline': baseline['best'], 'current': results['best']})
+    report = report.reindex(results.index).dropna()
+    report['ratio'] = report['current']/report['baseline']
+    report['peak_ratio'] = results['peak_kb']/baseline['peak_kb']
+    report['regression'] = report['ratio'] > threshold
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmarks of the finagle company pipeline')
+    parser.add_argument('--years', type=int, nargs='+', default=[6, 10, 50, 200])
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--quarters', type=int, nargs='+', default=[40, 400],
+                        help='final forecast quarters of the quarterly pipeline')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1, help='workers of the batch runs')
+    parser.add_argument('--save', help='store the results as a baseline json file')
+    parser.add_argument('--compare', help='baseline json file to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.years, args.batch, args.repeat, args.workers, args.quarters)
+    pd.set_option('display.width', 200)
+    print(results.to_string(float_format='{:.6g}'.format))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': results.to_dict(orient='index')}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = pd.DataFrame(json.load(f)['results']).T
+        report = compare(results, baseline, args.threshold)
+        print()
+        print(report.to_string(float_format='{:.3g}'.format))
+        if report['regression'].any():
+            print('\n{} regression(s) slower than {}x the baseline'.format(
+                report['regression'].sum(), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,3 @@
-from finagle.company import company
\ No newline at end of file
+__version__ = '0.1.0'
+
+from finagle.company import company, silent
@@ -0,0 +1,193 @@
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+import pickle
+import uuid
+
+import numpy as np
+
+import finagle
+from finagle import universe
+
+logger = logging.getLogger(__name__)
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'disk_hits', 'maxsize', 'currsize'])
+
+
+def _default(o):
+    '''json encoding of the numpy values and other sequences of a spec'''
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, (np.ndarray, tuple, range)):
+        return list(np.asarray(o).tolist())
+    if isinstance(o, set):
+        return sorted(o)
+    raise TypeError('{} can not be part of a cached spec'.format(type(o).__name__))
+
+
+def key(spec):
+    '''stable hash of a spec: the ticker, the constructor arguments, the
+    financials dict and the ordered method calls with their arguments, as
+    run by universe.run_spec(), and the version of the package
+
+    Steps given as a name or a [name, {}] pair hash the same, as do specs
+    with or without the final value() call.
+
+    Args:
+        spec: dict
+
+    Returns:
+        key: hex digest
+    '''
+    steps = [[step, {}] if isinstance(step, str) else list(step) for step in spec.get('steps', [])]
+    if 'value' not in [name for name, kwargs in steps]:
+        steps.append(['value', {}])
+    content = {
+        'version': finagle.__version__,
+        'ticker': spec.get('ticker'),
+        'args': spec.get('args', {}),
+        'financials': spec.get('financials'),
+        'steps': steps,
+    }
+    text = json.dumps(content, sort_keys=True, default=_default)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class Cache:
+    '''memoized valuations of specs, see universe.run_spec(), so that
+    identical inputs are calculated once
+
+    The companies are kept in a bounded in-memory LRU and, if a folder is
+    given, pickled to disk where they survive a restart of the kernel. The
+    keys include the package version, the disk store is cleared when it was
+    written by another version. Specs which fail are not cached.
+
+    Args:
+        maxsize: number of companies kept in memory
+        path: folder of the disk store, None to only cache in memory
+
+    Attributes:
+        hits (int): specs returned from the cache, from memory or disk
+        misses (int): specs which were calculated
+        disk_hits (int): hits read from the disk store
+    '''
+
+    def __init__(self, maxsize=128, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.__memory = collections.OrderedDict()
+        if path is not None:
+            self.__open()
+
+    def __open(self):
+        '''create the disk store, or clear it if it is from another version'''
+        os.makedirs(self.path, exist_ok=True)
+        marker = os.path.join(self.path, 'VERSION')
+        version = None
+        if os.path.exists(marker):
+            with open(marker) as f:
+                version = f.read().strip()
+        if version != finagle.__version__:
+            if version is not None:
+                logger.info('clearing the cache in %s written by version %s', self.path, version)
+            self.__clear_disk()
+            with open(marker, 'w') as f:
+                f.write(finagle.__version__)
+
+    def __clear_disk(self):
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.path, name))
+
+    def __file(self, k):
+        return os.path.join(self.path, k+'.pkl')
+
+    def __remember(self, k, c):
+        self.__memory[k] = c
+        self.__memory.move_to_end(k)
+        while len(self.__memory) > self.maxsize:
+            self.__memory.popitem(last=False)
+
+    def get(self, spec):
+        '''the cached company of a spec
+
+        Args:
+            spec: dict
+
+        Returns:
+            c: a copy of the cached company, None if the spec isn't cached
+        '''
+        k = key(spec)
+        if k in self.__memory:
+            self.__memory.move_to_end(k)
+            self.hits += 1
+            return copy.deepcopy(self.__memory[k])
+        if self.path is not None and os.path.exists(self.__file(k)):
+            with open(self.__file(k), 'rb') as f:
+                c = pickle.load(f)
+            self.__remember(k, c)
+            self.hits += 1
+            self.disk_hits += 1
+            return copy.deepcopy(c)
+        return None
+
+    def put(self, spec, c):
+        '''store the company of a spec
+
+        Args:
+            spec: dict
+            c: the company calculated from the spec
+        '''
+        k = key(spec)
+        c = copy.deepcopy(c)
+        self.__remember(k, c)
+        if self.path is not None:
+            # write to a temporary file first, readers never see a partial file
+            temp = os.path.join(self.path, '{}.{}.tmp'.format(k, uuid.uuid4().hex))
+            with open(temp, 'wb') as f:
+                pickle.dump(c, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, self.__file(k))
+
+    def run(self, spec):
+        '''the company of a spec, from the cache or calculated by
+        universe.run_spec() and cached
+
+        Args:
+            spec: dict
+
+        Returns:
+            c: the company, with value() calculated. Changes to it don't
+            change the cache.
+        '''
+        c = self.get(spec)
+        if c is not None:
+            return c
+        self.misses += 1
+        c = universe.run_spec(spec)
+        self.put(spec, c)
+        return c
+
+    def info(self):
+        '''the hit and miss counters and the size of the in-memory LRU
+
+        Returns:
+            info: CacheInfo
+        '''
+        return CacheInfo(self.hits, self.misses, self.disk_hits, self.maxsize, len(self.__memory))
+
+    def clear(self, disk=True):
+        '''empty the cache and reset the counters
+
+        Args:
+            disk: also delete the disk store
+        '''
+        self.__memory.clear()
+        self.hits = self.misses = self.disk_hits = 0
+        if disk is True and self.path is not None:
+            self.__clear_disk()
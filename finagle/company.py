@@ -1,15 +1,98 @@
 import pandas as pd
-import xlrd
-from string import ascii_letters
+import copy
 import datetime
 import numpy as np
-from scipy import interpolate
 import logging
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-import os
 
-pd.set_option('mode.chained_assignment', None)
+from finagle import engine, report, store
+from finagle.financials import Financials
+
+# the package logger, each company logs to a child named after its ticker.
+# Messages propagate to the handlers and levels of the application, nothing is
+# printed if it has none.
+logger = logging.getLogger(__name__)
+logging.getLogger('finagle').addHandler(logging.NullHandler())
+
+# levels of the loggers of the package before silent(), restored by
+# silent(False)
+_levels = {}
+
+# periods in a year of each periodicity
+PERIODS = {'annual': 1, 'quarterly': 4, 'monthly': 12}
+
+
+def silent(on=True):
+    '''switch off all the logging of the package, including the log files,
+    e.g. for batch runs
+
+    Args:
+        on: True to silence, False to restore the levels of the loggers
+    '''
+    if on is True:
+        loggers = [logging.getLogger('finagle')] + [
+            log for name, log in logging.root.manager.loggerDict.items()
+            if name.startswith('finagle.') and isinstance(log, logging.Logger) and log.level != logging.NOTSET]
+        for log in loggers:
+            _levels.setdefault(log.name, log.level)
+            log.setLevel(logging.CRITICAL+1)
+    else:
+        for name, level in _levels.items():
+            logging.getLogger(name).setLevel(level)
+        _levels.clear()
+
+
+def _level(log, level):
+    '''set the level of a logger of the package, or the level restored by
+    silent(False) while it is silenced'''
+    if _levels:
+        _levels[log.name] = level
+        log.setLevel(logging.CRITICAL+1)
+    else:
+        log.setLevel(level)
+
+
+def _calendar(start, n, months):
+    '''dates of n periods which are a number of calendar months apart
+
+    Every date is stepped from the start, so the dates don't drift, and a
+    start at a month end stays at month ends, e.g. 2021-9-30 is followed by
+    2021-12-31 and 2022-3-31 for quarters.
+
+    Args:
+        start: date of period 0
+        n: number of periods
+        months: months in a period, 12 for years
+
+    Returns:
+        dates: DatetimeIndex
+    '''
+    start = pd.Timestamp(start)
+    month = np.datetime64(start.strftime('%Y-%m'), 'M') + months*np.arange(n)
+    first = month.astype('datetime64[D]')
+    last = ((month+1).astype('datetime64[D]') - first).astype(int)
+    day = last if start.is_month_end else np.minimum(start.day, last)
+    return pd.DatetimeIndex(first + (day-1) + (start - start.normalize()).to_timedelta64())
+
+
+# inputs of each column calculated by fcf_from_ebitda(), in the order in which
+# they are calculated. Used to find the columns downstream of a change.
+DEPENDS = {
+    'interest': ['debt'],
+    'da': ['ebitda', 'capex', 'da'],
+    'income_pretax': ['ebitda', 'sbc', 'da', 'interest'],
+    'dDebt': ['debt'],
+    'tax_cash': ['income_pretax'],
+    'tax': ['income_pretax'],
+    'income_taxable': ['income_pretax'],
+    'nol': ['income_pretax'],
+    'fcf': ['ebitda', 'sbc', 'tax_cash', 'capex', 'dwc', 'interest'],
+    'fcfe': ['ebitda', 'sbc', 'tax_cash', 'capex', 'dwc', 'dDebt', 'interest', 'MnA'],
+    'fcff': ['ebitda', 'sbc', 'tax_cash', 'capex', 'dwc', 'interest', 'MnA'],
+    'dividend_policy': ['fcf', 'shares'],
+    'dividend': ['fcfe', 'buybacks', 'shares'],
+    'cash': ['cash', 'fcfe'],
+    'noa': ['noa'],
+}
 
 
 class company:
@@ -56,15 +139,23 @@ class company:
         roict (float): terminal return on invested capital, used for
         calculating depreciation
         year (int): final forecast year. Year before the terminal year.
+        Counted in periods if the period isn't annual.
         fcfe (list,None): free cash flow to equity
         fcff (list,None): free cash flow to firm
         roict (float): return on invested capital in the terminal year, 15%
         default, mostly creates impact via taxes (by calculating depreciation)
         since gt and capex are explicitly specified
         dividend (float,list)): current dividend policy
+        logfile (str,bool,None): file which the log of this company is
+        written to, True for '<ticker>.log', None for no file
+        period (str): 'annual', 'quarterly' or 'monthly'. The financials,
+        forecasts, growth rates and dividends are per period. re, rd, gt and
+        roict are annual and converted to each period, leverage and
+        acquisition multiples are on annualized (run-rate) EBITDA.
 
     Attributes:
-        logfile (str): name of logfile
+        log (Logger): logger of this company, 'finagle.company.<ticker>'
+        logfile (str,None): name of logfile
         ticker (str): ticker symbol of the company
         gt (float): terminal growth, required for model closure
         re (float): cost of equity
@@ -78,21 +169,43 @@ class company:
         price (float): current share price
         year (int): final forecast year. Year before the terminal year.
         years (list): list of years, starting at 0 (current year)
+        period (str): 'annual', 'quarterly' or 'monthly'
+        periods (int): number of periods in a year
         now (date): todays date
         buybacks (bool):
         dividend (list): current dividend policy
+        dirty (dict,None): first year of each input column changed since the
+        FCF's were calculated, None if they haven't been calculated
+        sensitivities (dict): sensitivity tables added to the report by
+        display_fin(), by sheet name
+        fin (DataFrame): the yearly financials, built from compacted when it
+        is first used after compact()
+        compacted (Financials,None): the compact container of the fin
+        dataframe, see compact()
+        _shared (set): columns of fin whose arrays are shared with a fork,
+        they are copied before they are changed in place
     '''
 
     def __init__(self, financials=None, ticker=None, re=None, rd=None, t=None, te=None,
                  shares=1, price=0, gt=0, fcfe=None, fcff=None, fcf=None,
-                 roict=0.15, year=6, dividend=0):
-
-        # setup logging
-        self.logfile = ticker + '.log'
-        logging.basicConfig(filemode='w', level=logging.INFO,
-                            format='%(asctime)s %(levelname)s:%(message)s')
-        logging.FileHandler(filename=self.logfile, mode='w')
-        logging.info(ticker)
+                 roict=0.15, year=6, dividend=0, logfile=None, period='annual'):
+
+        # setup logging, a child of the package logger for each ticker with
+        # an optional file of its own
+        self.log = logger.getChild(str(ticker))
+        for handler in [h for h in self.log.handlers if isinstance(h, logging.FileHandler)]:
+            self.log.removeHandler(handler)
+            handler.close()
+        if logfile is True:
+            logfile = str(ticker) + '.log'
+        self.logfile = logfile
+        # the log file records the info messages of this ticker
+        _level(self.log, logging.INFO if logfile else logging.NOTSET)
+        if logfile:
+            handler = logging.FileHandler(filename=logfile, mode='w')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s:%(message)s'))
+            self.log.addHandler(handler)
+        self.log.info('%s', ticker)
         
         # read in various attributes
         self.ticker = ticker
@@ -106,8 +219,17 @@ class company:
         self.price = price
         self.year = year
         self.years = list(range(year+1))
+        if period not in PERIODS:
+            raise ValueError('period must be one of {}'.format(', '.join(PERIODS)))
+        self.period = period
+        self.periods = PERIODS[period]
         self.now = datetime.date.today()
         self.buybacks = False
+        self.dirty = None
+        self.sensitivities = {}
+        self._fin = None
+        self.compacted = None
+        self._shared = set()
 
         if isinstance(dividend, list):
             self.dividend = dividend
@@ -133,6 +255,106 @@ class company:
             self.fin['dividend'] = (
                 self.fin['fcfe']-self.fin['buybacks'])/self.fin['shares']
 
+    @property
+    def fin(self):
+        if self._fin is None and self.compacted is not None:
+            self._fin = self.compacted.to_frame()
+            self.compacted = None
+        return self._fin
+
+    @fin.setter
+    def fin(self, fin):
+        self._fin = fin
+        self.compacted = None
+        self._shared = set()
+
+    def compact(self):
+        '''replace the fin dataframe by a compact array container to save
+        memory, e.g. when keeping a large universe
+
+        The batch methods (value_batch(), sensitivity(), implied_growth() and
+        simulate()) calculate directly from the container. The dataframe is
+        built again when fin is next used, e.g. by display_fin() or a
+        fcf_to_X() method. Scratch columns such as debt_Target are dropped and
+        the columns are stored as floats.
+
+        Returns:
+            compacted: Financials
+        '''
+        if self._fin is not None:
+            self.compacted = Financials.from_frame(self._fin)
+            self._fin = None
+        return self.compacted
+
+    def fork(self):
+        '''a copy of the company for branching scenarios off a calculated
+        base case, e.g. different buyback schedules or acquisitions
+
+        The fork shares the column arrays of fin with the company. A column
+        is copied, in the fork or in the company, only when it is changed, so
+        many forks cost little memory. The other attributes are copied.
+
+        Returns:
+            c: company
+        '''
+        c = copy.copy(self)
+        for key, value in vars(self).items():
+            if key not in ('log', '_fin', 'compacted', '_shared'):
+                setattr(c, key, copy.deepcopy(value))
+        if self._fin is not None:
+            # the columns of a 2d block are views of the same base array
+            arrays = [self._fin[key].to_numpy() for key in self._fin.columns]
+            bases = {id(a if a.base is None else a.base) for a in arrays}
+            if len(bases) < len(arrays):
+                # an array for each column so that they can be shared and
+                # copied one at a time
+                fin = pd.DataFrame(index=self._fin.index)
+                for key in self._fin.columns:
+                    fin[key] = self._fin[key].to_numpy()
+                self._fin = fin
+            c._fin = self._fin.copy(deep=False)
+            columns = set(self._fin.columns)
+        else:
+            columns = set(self.compacted.columns) if self.compacted is not None else set()
+        self._shared = self._shared | columns
+        c._shared = set(columns)
+        self.log.info('forked')
+        return c
+
+    def __own(self, *keys):
+        '''copy the columns shared with a fork before changing them in place
+
+        Args:
+            keys: names of the columns
+        '''
+        for key in keys:
+            if key in self._shared:
+                self.fin[key] = self.fin[key].to_numpy(copy=True)
+                self._shared.discard(key)
+
+    def __columns(self):
+        '''the numeric columns of the fin dataframe as float arrays, read
+        from the compact container if there is one
+
+        Returns:
+            col: dictionary of column name to array
+        '''
+        if self.compacted is not None:
+            return {key: self.compacted[key] for key in self.compacted.columns}
+        return {key: self._fin[key].to_numpy(dtype=float) for key in self._fin.columns
+                if self._fin[key].dtype.kind in 'fiub'}
+
+    def __rate(self, r):
+        '''convert an annual rate to the rate of one period
+
+        Args:
+            r: annual rate, float or array
+
+        Returns:
+            rate: rate of one period
+        '''
+        return engine.period_rate(r, self.periods)
+
     def __stream(self, sf, st):
         '''create a periodic stream of values based of yearly forecasts and
         terminal values
@@ -146,7 +368,7 @@ class company:
         '''
 
         if np.isnan(st) is True:
-            logging.error('Terminal value is a NaN, cannot create forecast')
+            self.log.error('Terminal value is a NaN, cannot create forecast')
 
         if isinstance(sf, list):
             length = np.count_nonzero(~np.isnan(sf))
@@ -160,8 +382,7 @@ class company:
         x = list(range(length))
         x.append(self.year)
         s = sf+[st]
-        f = interpolate.interp1d(x, s)
-        values = f(self.years)
+        values = np.interp(self.years, x, s)
         return values
 
     def __datacheck(self):
@@ -176,7 +397,7 @@ class company:
             if self.year < len(self.fin.ebitda)-1:
                 self.year = len(self.fin.ebitda)-1
                 self.years = list(range(self.year+1))
-                logging.warning("Warning: length of EBITDA forecast appear larger then the 'year' parameter used at initialization")
+                self.log.warning("Warning: length of EBITDA forecast appear larger then the 'year' parameter used at initialization")
 
             from_ebitda_columns = ['revenue','price', 'tax', 'interest', 'capex', 'noa',
                                    'nol', 'ebitda', 'shares', 'dwc', 'debt',
@@ -195,10 +416,10 @@ class company:
             self.data_for_earnings = True
 
         if self.data_for_ebitda is True:
-            logging.info('datacheck complete: financial dataset appears complete for fcf_from_ebitda')
+            self.log.info('datacheck complete: financial dataset appears complete for fcf_from_ebitda')
 
         if self.data_for_earnings is True:
-            logging.info('datacheck complete: financial dataset appears complete for fcf_from_earnings')
+            self.log.info('datacheck complete: financial dataset appears complete for fcf_from_earnings')
 
     def __pv(self, cfs, g, r, cft=None):
         '''calculate the present value of future cash flows. To be even more
@@ -209,25 +430,71 @@ class company:
         Args:
             cfs: array of cash flows
             g:
-            r:
+            r: discount rate, a float or an array with a rate for each year
             cft: termal cash flow
 
         Returns:
             value:
         '''
-        if isinstance(r, float):
-            r = [r for cf in cfs]
-        else:
-            r = list(r)
+        return list(engine.pv(np.asarray(cfs, dtype=float), np.asarray(r, dtype=float), g, cft))
 
-        if cft is None:
-            value = [cfs.iloc[-1]*(1+g)/(r[-1]-g)]
-        else:
-            value = [cft/(r[-1]-g)]
-        r = r[::-1]
-        for i, cf in enumerate(cfs[:0:-1], 1):
-            value.insert(0, (cf+value[0])/(1+r[i]))
-        return value
+    def __scenarios(self, re, rd, gt, roict, t, ebitda=None, capex=None, debt=None,
+                    MnA=None, cash0=None, n_da=None):
+        '''recalculate the FCF's and values for a batch of scenarios with the
+        array engine
+
+        Forecasts and capital allocation decisions in the fin dataframe are
+        held constant unless they are provided, changes in FCFE relative to
+        the current model are paid out as dividends.
+
+        Args:
+            re, rd, gt, roict, t: arrays of assumptions, shape (scenarios,)
+            ebitda: ebitda forecasts, shape (scenarios, year+1)
+            capex: capex forecasts, shape (scenarios, year+1)
+            debt: debt forecasts, shape (scenarios, year+1)
+            MnA: acquisition outlays, shape (scenarios, year+1)
+            cash0: cash in year 0 after an adjustment, which is also the cash
+            distributed in the DDM, shape (scenarios,)
+            n_da: number of depreciation forecasts to keep, the rest is
+            interpolated to the terminal year
+
+        Returns:
+            values: dictionary of the yearly value columns, shape
+            (scenarios, year+1)
+        '''
+        re, rd, gt = self.__rate(re), self.__rate(rd), self.__rate(gt)
+        roict = np.asarray(roict)/self.periods
+        col = self.__columns()
+        if ebitda is None:
+            ebitda = col['ebitda']
+        if capex is None:
+            capex = col['capex']
+        if debt is None:
+            debt = col['debt']
+        if MnA is None:
+            MnA = col['MnA']
+        if n_da is None:
+            n_da = self.n_da
+        cash = col['cash']
+        cash_DDM = self.cash0
+        if cash0 is not None:
+            cash = np.repeat(cash[None, :], np.size(cash0), axis=0)
+            cash[:, 0] = cash0
+            cash_DDM = cash0
+
+        dat = engine.terminal_da(capex[..., -1], ebitda[..., -1], gt, roict, t)
+        cols = engine.fcf_from_ebitda(
+            ebitda=ebitda, sbc=col['sbc'], capex=capex, dwc=col['dwc'],
+            debt=debt, MnA=MnA, shares=col['shares'], buybacks=col['buybacks'],
+            da=engine.stream(col['da'][:n_da], dat, self.year),
+            interest0=col['interest'][0], tax0=col['tax'][0], nol0=col['nol'][0],
+            cash0=cash[..., 0], dividend=self.dividend, rd=rd, t=t, te=self.te)
+        dividend = col['dividend'] + (cols['fcfe']-col['fcfe'])/col['shares']
+        return engine.value(
+            fcf=cols['fcf'], fcfe=cols['fcfe'], fcff=cols['fcff'], dDebt=cols['dDebt'],
+            debt=debt, dividend=dividend, shares=col['shares'], noa=col['noa'],
+            cash=cash, cashBS=col['cashBS'], cash0=cash_DDM, shares0=self.shares,
+            re=re, rd=rd, t=t, gt=gt)
 
     def __wacc(self):
         '''return weighted average cost of capital
@@ -236,8 +503,8 @@ class company:
             self.fin['wacc']:
         '''
         self.fin['EV'] = self.fin.debt + self.fin.equity
-        self.fin['wacc'] = (self.fin.debt*self.rd*(1-self.t) +
-                            self.fin.equity*self.re)/self.fin.EV
+        self.fin['wacc'] = (self.fin.debt*self.__rate(self.rd)*(1-self.t) +
+                            self.fin.equity*self.__rate(self.re))/self.fin.EV
         return self.fin['wacc']
 
     def forecast_ebitda(self, ebitda_ttm, gf, financials=None,me=None,mc=None,gsnext=None):
@@ -256,7 +523,7 @@ class company:
             ebitda:
 
         '''
-        g = self.__stream(gf, self.gt)            
+        g = self.__stream(gf, self.__rate(self.gt))
         ebitda = [ebitda_ttm]
         revenue = [np.nan]
         
@@ -270,7 +537,7 @@ class company:
 
             gfs = [0 for x in range(length)]
             gfs.append(gsnext)
-            gs = self.__stream(gfs,self.gt)            
+            gs = self.__stream(gfs, self.__rate(self.gt))
 
             for i in range(self.year):
                 if i < length: 
@@ -397,27 +664,32 @@ class company:
 
         Returns:
         '''
-        financials['date'] = [datetime.datetime.strptime(
-            financials['date'], '%Y-%m-%d')+datetime.timedelta(days=365*i) for i in range(self.year+1)]
+        financials['date'] = _calendar(datetime.datetime.strptime(financials['date'], '%Y-%m-%d'),
+                                       self.year+1, 12//self.periods)
         self.fin = pd.DataFrame({key: pd.Series(value)
                                 for key, value in financials.items()})
         self.fin.set_index('date', inplace=True)
         self.fin['shares'] = self.shares
         self.fin['price'] = self.price
-        self.fin['MnA'] = 0
+        self.fin['MnA'] = self.fin['MnA'].fillna(0) if 'MnA' in self.fin.columns else 0
         self.fin['buybacks'] = 0
         self.fin['cashBS'] = 0
 
         try:
-            self.fin['cashBS'].iloc[0] = self.fin['cash'].iloc[0]
+            self.fin.iloc[0, self.fin.columns.get_loc('cashBS')] = self.fin['cash'].iloc[0]
             self.cash0 = self.fin['cash'].iloc[0]
         except:
-            logging.info('no cash key')
+            self.log.info('no cash key')
+
+        if 'da' in self.fin.columns:
+            # number of forecasted da values, the balance is interpolated to
+            # the terminal year
+            self.n_da = np.count_nonzero(~np.isnan(self.fin['da'].to_numpy(dtype=float)))
 
+        self.dirty = None
         self.__datacheck()
-        logging.info('input data used for the forecast is:')
-        logging.info(financials)
-        logging.info('load_financials() method complete')
+        self.log.debug('input data used for the forecast is: %s', financials)
+        self.log.info('load_financials() method complete')
 
     def fcf_from_earnings(self, payout=1, gf=0, ROE=1):
         '''
@@ -430,134 +702,195 @@ class company:
         '''
 
         if self.data_for_earnings is False:
-            logging.error('financial dataset cannot be used for calculating FCF from earnings')
+            self.log.error('financial dataset cannot be used for calculating FCF from earnings')
 
-        g = self.__stream(gf, self.gt)
+        g = self.__stream(gf, self.__rate(self.gt))
 
+        e = self.fin['e'].to_numpy(dtype=float, copy=True)
         for i in range(self.year):
-            self.fin['e'].iloc[i+1] = self.fin['e'].iloc[i]*(1+g[i])
+            e[i+1] = e[i]*(1+g[i])
+        self.fin['e'] = e
 
-        payout_t = 1 - self.gt/ROE
+        payout_t = 1 - self.__rate(self.gt)*self.periods/ROE
         payouts = self.__stream(payout, payout_t)
 
         self.fin['fcfe'] = self.fin['e']*payouts
-        logging.info('fcf_from_earnings() method complete')
+        self.log.info('fcf_from_earnings() method complete')
 
     def fcf_from_ebitda(self):
-        '''
+        '''calculate interest, depreciation, taxes (including the NOL carry
+        forward) and the free cash flows from the ebitda forecast
+
+        The calculation is done by the array engine and the resulting columns
+        are written back to the fin dataframe in one step.
+
         Args:
         Returns:
         '''
 
         if self.data_for_ebitda is False:
-            logging.error('financial dataset cannot be used for calculating FCF from EBITDA')
+            self.log.error('financial dataset cannot be used for calculating FCF from EBITDA')
 
-        interest0 = self.fin['interest'].iloc[0]
-        self.fin['interest'] = self.rd*self.fin.debt.shift(1)
-        self.fin['interest'].iloc[0] = interest0
-        
         # really complicated way to calculate the terminal depreciation for
         # situations.where there is terminal growth. This will enforce that
         # Capex>=Depreciation so that assets continue to increase as the
         # company grows its bottom line
-
-        C = self.gt/self.roict*(1-self.t)
-        dat = (self.fin['capex'].iloc[-1]-C*self.fin['ebitda'].iloc[-1])/(1-C)
+        dat = engine.terminal_da(self.fin['capex'].iloc[-1], self.fin['ebitda'].iloc[-1],
+                                 self.__rate(self.gt), self.roict/self.periods, self.t)
         if dat < 0:
-            logging.error('negative depreciation in terminal year, check roic and growth assumptions')
-
-        self.fin['da'] = self.__stream(self.fin['da'], dat)
-        self.fin['income_pretax'] = self.fin.ebitda - \
-            self.fin.sbc - self.fin.da - self.fin.interest
-        self.fin['dDebt'] = self.fin['debt']-self.fin['debt'].shift(1)
-        # todo: calculate from interest0 and Debt0
-        self.fin['dDebt'].iloc[0] = 0
-        
-        #Calculating taxes
-
-        self.fin['tax_cash'] = np.nan
-        self.fin['tax_cash'].iloc[0] = self.fin['tax'].iloc[0]
-  
-        if self.te is None:
-            tax0 = max(self.t*(self.fin['income_pretax'].iloc[0]),self.fin['tax'].iloc[0]) #important to avoid -'ve taxes with NOL's, also so they don't have unsustainably low taxes
-            tax1 = tax0 + self.t * (self.fin['income_pretax'].iloc[1] - self.fin['income_pretax'].iloc[0]) 
-            te = tax1/self.fin['income_pretax'].iloc[1]
-        else:
-            te = self.te #uses the value set during initialization
-        
-        self.fin['income_taxable'] = np.nan
-        self.fin['income_taxable'].iloc[0] = max(self.fin['income_pretax'].iloc[0]*(1-self.fin['nol'].iloc[0] > 0), 0) #zero the income in the baseline year if NOL>0
-        for i in range(1, self.year+1):
-            self.fin['nol'].iloc[i] = max(self.fin['nol'].iloc[i-1] - self.fin['income_pretax'].iloc[i], 0)
-            self.fin['income_taxable'].iloc[i] = max(0, self.fin['income_pretax'].iloc[i] - self.fin['nol'].iloc[i-1])
-            if i == 1:
-                self.fin['tax'].iloc[1] = te*max(self.fin['income_pretax'].iloc[1],0)
-                self.fin['tax_cash'].iloc[i] = self.fin['tax'].iloc[1] + self.t * min((self.fin['nol'].iloc[i] - self.fin['nol'].iloc[i-1]),0)
-            else:
-                self.fin['tax'].iloc[i] = self.fin['tax'].iloc[i-1]+self.t * (max(self.fin['income_pretax'].iloc[i],0) - max(self.fin['income_pretax'].iloc[i-1],0))
-                self.fin['tax_cash'].iloc[i] = self.fin['tax'].iloc[i]+self.t * min((self.fin['nol'].iloc[i] - self.fin['nol'].iloc[i-1]),0)
-                     
-        #calculating FCF
-
-        self.fin['fcf'] = self.fin.ebitda - self.fin.sbc - \
-            self.fin.tax_cash - self.fin.capex - self.fin.dwc - self.fin.interest
-        self.fin['fcfe'] = self.fin.ebitda - self.fin.sbc - self.fin.tax_cash - \
-            self.fin.capex - self.fin.dwc + self.fin.dDebt - self.fin.interest - self.fin.MnA
-        self.fin['fcff'] = self.fin.ebitda - self.fin.sbc - self.fin.tax_cash - \
-            self.fin.capex - self.fin.dwc - self.fin.interest*self.t - self.fin.MnA
-
-        self.fin['dividend_policy'] = 0
-        n_div = len(self.dividend)
-        for i in range(self.year+1):
-            if (i < n_div):
-                self.fin['dividend_policy'].iloc[i] = self.dividend[i] * \
-                    self.fin['shares'].iloc[i]
-            else:
-                self.fin['dividend_policy'].iloc[i] = max(self.dividend[n_div-1]*self.fin['shares'].iloc[n_div-1] /
-                                                          self.fin['fcf'].iloc[n_div-1]*self.fin['fcf'].iloc[i], self.fin['dividend_policy'].iloc[i-1])
-        self.fin['dividend'] = (self.fin['fcfe']-self.fin['buybacks'])/self.fin['shares']
-        self.fin['cash'].iloc[1:] = self.fin['fcfe'].iloc[1:]
-        self.fin['cash'] = self.fin['cash'].cumsum()
-        self.fin['noa'].iloc[1:] = self.fin['noa'].iloc[0]
-        logging.info('fcf_from_ebitda() method complete')
-
-    def fcf_to_debt(self, leverage=3, year_d=1):
+            self.log.error('negative depreciation in terminal year, check roic and growth assumptions')
+
+        # the model is calculated on float64 arrays and written back once
+        col = {key: self.fin[key].to_numpy(dtype=float) for key in
+               ['ebitda', 'sbc', 'capex', 'dwc', 'debt', 'MnA', 'shares', 'buybacks', 'da']}
+        cols = engine.fcf_from_ebitda(
+            ebitda=col['ebitda'], sbc=col['sbc'], capex=col['capex'], dwc=col['dwc'],
+            debt=col['debt'], MnA=col['MnA'], shares=col['shares'], buybacks=col['buybacks'],
+            da=engine.stream(col['da'][:self.n_da], dat, self.year),
+            interest0=self.fin['interest'].iloc[0], tax0=self.fin['tax'].iloc[0],
+            nol0=self.fin['nol'].iloc[0], cash0=self.fin['cash'].iloc[0],
+            dividend=self.dividend, rd=self.__rate(self.rd), t=self.t, te=self.te)
+
+        for key, value in cols.items():
+            self.fin[key] = value
+        self.fin['noa'] = self.fin['noa'].iloc[0]
+        self.dirty = {}
+        self.log.info('fcf_from_ebitda() method complete')
+
+    def __touch(self, column, year):
+        '''record that an input column of fcf_from_ebitda() has changed
+
+        Args:
+            column: name of the column in the fin dataframe
+            year: first year which has changed
+        '''
+        if self.dirty is not None:
+            self.dirty[column] = min(year, self.dirty.get(column, year))
+
+    def __update(self):
+        '''recalculate only the columns and years downstream of the changes
+        recorded by __touch()
+
+        Columns are found from the DEPENDS graph. The years from the first
+        change onwards are calculated by the array engine, continuing from the
+        last unchanged year. If the FCF's haven't been calculated yet, or the
+        change starts in year 0 or 1 (which sets the effective tax rate),
+        fcf_from_ebitda() is run instead.
+        '''
+        if self.dirty is None:
+            self.fcf_from_ebitda()
+            return
+
+        affected = set(self.dirty)
+        for key, inputs in DEPENDS.items():
+            if affected.intersection(inputs):
+                affected.add(key)
+
+        start = min([year for key, year in self.dirty.items() if key != 'noa'], default=None)
+        if 'da' in affected and start is not None:
+            # the interpolated depreciation changes with the terminal year
+            start = min(start, self.n_da)
+        if start is not None and start <= 1:
+            self.fcf_from_ebitda()
+            return
+
+        col = {key: self.fin[key].to_numpy(dtype=float, copy=True) for key in
+               ['ebitda', 'sbc', 'capex', 'dwc', 'debt', 'MnA', 'shares', 'buybacks',
+                'cash', 'noa', 'interest', 'tax', 'nol'] + list(DEPENDS)}
+        if start is not None:
+            k = start-1
+            if 'da' in affected:
+                dat = engine.terminal_da(col['capex'][-1], col['ebitda'][-1], self.__rate(self.gt),
+                                         self.roict/self.periods, self.t)
+                if dat < 0:
+                    self.log.error('negative depreciation in terminal year, check roic and growth assumptions')
+                col['da'] = engine.stream(col['da'][:self.n_da], dat, self.year)
+            tail = engine.free_cash_flows(
+                ebitda=col['ebitda'][k:], sbc=col['sbc'][k:], capex=col['capex'][k:],
+                dwc=col['dwc'][k:], debt=col['debt'][k:], MnA=col['MnA'][k:], da=col['da'][k:],
+                interest0=col['interest'][k], tax0=col['tax'][k], nol0=col['nol'][k],
+                rd=self.__rate(self.rd), t=self.t, carry=True)
+            for key, value in tail.items():
+                col[key][start:] = value[1:]
+            col['dividend_policy'] = engine.dividend_policy(self.dividend, col['shares'], col['fcf'])
+            col['dividend'] = (col['fcfe']-col['buybacks'])/col['shares']
+            col['cash'][start:] = engine.cumulative_cash(col['cash'][k], col['fcfe'][k:])[1:]
+        col['noa'][1:] = col['noa'][0]
+
+        for key in DEPENDS:
+            if key in affected:
+                self.fin[key] = col[key]
+        self.dirty = {}
+
+    def fcf_to_debt(self, leverage=3, year_d=1, tol=1e-6, max_iter=50, warm_start=None):
         '''Adjust debt levels to desired target.
 
         Decrease (or increase) FCFE to reduce (or increase) debt towards target
         leverage prerequisite: Must first have fcf defined
 
+        Interest depends on the debt and the debt paydown depends on the fcf
+        after interest, so the debt schedule is solved by fixed-point
+        iteration until it changes by less than tol between passes.
+
         Args:
             leverage = desired Debt/EBITDA, default value is 3
+            year_d = first year in which the debt is adjusted
+            tol = convergence tolerance on the debt schedule, in the units of
+            the financials
+            max_iter = maximum number of passes, at least 1
+            warm_start = debt schedule to start from, e.g. the 'debt' of a
+            previous report, instead of the current debt
         Returns:
+            report: dictionary with the 'iterations', the 'residual' (largest
+            change in debt in the last pass), 'converged' and the 'debt'
+            schedule
         '''
 
+        if max_iter < 1:
+            raise ValueError('max_iter must be at least 1')
+
         # increase debt if fcf is negative and cash is 0
         if self.data_for_ebitda is False:
-            logging.error('financial dataset cannot be used to optimize leverage')
+            self.log.error('financial dataset cannot be used to optimize leverage')
 
         if self.fin['fcf'].empty:
-            logging.error('first calculate fcf')
-
-        self.fin['debt_Target'] = [leverage*self.fin['ebitda'].iloc[i]
-                                   if self.fin['ebitda'].iloc[i] > 0 else 0 for i in range(self.year+1)]
-
-        # run the loop 3 times just to converge on the interest and FCF
-        for i in range(3):
-            for i in range(year_d-1, self.year):
-                if (self.fin['debt'].iloc[i]-self.fin['debt_Target'].iloc[i+1] < 0):  # underlevered
-                    dDebt = -1*(self.fin['debt'].iloc[i] -
-                                self.fin['debt_Target'].iloc[i+1])
-                else:  # overlevered
-                    if i == 0:
-                        dDebt = -1*min(self.fin['debt'].iloc[i]-self.fin['debt_Target'].iloc[i+1], self.fin['fcf'].iloc[i+1] +
-                                       self.fin['cash'].iloc[i]-self.fin['MnA'].iloc[i+1]-self.fin['dividend_policy'].iloc[i+1])
-                    else:
-                        dDebt = -1*min(self.fin['debt'].iloc[i]-self.fin['debt_Target'].iloc[i+1],
-                                       self.fin['fcf'].iloc[i+1]-self.fin['MnA'].iloc[i+1]-self.fin['dividend_policy'].iloc[i+1])
-                self.fin['debt'].iloc[i+1] = self.fin['debt'].iloc[i]+dDebt
-            self.fcf_from_ebitda()
-        logging.info('fcf_to_debt() method complete')
+            self.log.error('first calculate fcf')
+
+        ebitda = self.fin['ebitda'].to_numpy(dtype=float)
+        self.fin['debt_Target'] = np.where(ebitda > 0, leverage*self.periods*ebitda, 0)
+
+        if warm_start is not None:
+            debt = self.fin['debt'].to_numpy(dtype=float, copy=True)
+            debt[year_d:] = np.asarray(warm_start, dtype=float)[year_d:]
+            self.fin['debt'] = debt
+            self.__touch('debt', year_d)
+            self.__update()
+
+        converged = False
+        for iteration in range(1, max_iter+1):
+            debt = self.fin['debt'].to_numpy(dtype=float)
+            new = engine.debt_schedule(
+                debt, self.fin['debt_Target'].to_numpy(dtype=float),
+                fcf=self.fin['fcf'].to_numpy(dtype=float), cash0=self.fin['cash'].iloc[0],
+                MnA=self.fin['MnA'].to_numpy(dtype=float),
+                policy=self.fin['dividend_policy'].to_numpy(dtype=float), year_d=year_d)
+            changed = np.flatnonzero(new != debt)
+            if changed.size > 0:
+                self.fin['debt'] = new
+                self.__touch('debt', changed[0])
+                self.__update()
+            residual = np.max(np.abs(new-debt))
+            if residual <= tol:
+                converged = True
+                break
+
+        if converged is False:
+            self.log.warning('fcf_to_debt() did not converge after %d iterations, residual %g',
+                            iteration, residual)
+        self.debt_report = {'iterations': iteration, 'residual': residual,
+                            'converged': converged, 'debt': self.fin['debt'].to_numpy(dtype=float)}
+        self.log.info('fcf_to_debt() method complete')
+        return self.debt_report
 
     def fcf_to_bs(self):
         '''
@@ -565,16 +898,19 @@ class company:
 
         Returns:
         '''
-        self.fin['cashBS'].iloc[0] = self.fin['cash'].iloc[0]
+        col = self.__columns()
+        cashBS = np.empty(self.year+1)
+        cashBS[0] = col['cash'][0]
         for i in range(self.year):
-            self.fin['cashBS'].iloc[i+1] = self.fin['cashBS'].iloc[i] + self.fin['fcfe'].iloc[i +
-                                                                                              1] - self.fin['dividend_policy'].iloc[i+1] - self.fin['buybacks'].iloc[i+1]
+            cashBS[i+1] = cashBS[i] + col['fcfe'][i+1] - col['dividend_policy'][i+1] - col['buybacks'][i+1]
+        self.fin['cashBS'] = cashBS
 
-        self.fin['dividend'] = self.fin['dividend_policy']/self.fin['shares']
-        self.fin['dividend'].iloc[-1] = self.fin['dividend'].iloc[-1] + self.fin['cashBS'].iloc[-1] / \
-            self.fin['shares'].iloc[-1]  # all remaining cash distributed the year before terminal
+        dividend = col['dividend_policy']/col['shares']
+        # all remaining cash distributed the year before terminal
+        dividend[-1] = dividend[-1] + cashBS[-1]/col['shares'][-1]
+        self.fin['dividend'] = dividend
         self.cash0 = 0  # discount future cash back to NPV
-        logging.info('fcf_to_bs() method complete')
+        self.log.info('fcf_to_bs() method complete')
 
     def fcf_to_buyback(self, price, dp='proportional'):
         '''Use cash balance to buyback shares and reduce sharecounts
@@ -590,56 +926,51 @@ class company:
         Returns:
         '''
         self.fin['price'] = price
+        col = self.__columns()
+        fcfe, policy = col['fcfe'], col['dividend_policy']
+        shares, buybacks = col['shares'], col['buybacks'].copy()
         # limit buybacks to when fcf>0
-        if dp == 'constant':
-            for i in range(self.year):
-                if i == 0:
-                    self.fin['buybacks'].iloc[i+1] = self.fin['fcfe'].iloc[i+1] + \
-                        self.fin['cash'].iloc[0] - \
-                        self.fin['dividend_policy'].iloc[i+1]
-                    self.fin['shares'].iloc[i+1] = self.fin['shares'].iloc[i] - \
-                        self.fin['buybacks'].iloc[i+1] / \
-                        self.fin['price'].iloc[i]
-                else:
-                    self.fin['buybacks'].iloc[i+1] = self.fin['fcfe'].iloc[i +
-                                                                           1] - self.fin['dividend_policy'].iloc[i+1]
-                    self.fin['shares'].iloc[i+1] = self.fin['shares'].iloc[i] - \
-                        self.fin['buybacks'].iloc[i+1] / \
-                        self.fin['price'].iloc[i]
-        elif dp == 'proportional':
-            EV = price*self.shares + \
-                self.fin['debt'].iloc[0]-self.fin['cash'].iloc[0]
-            # calculate the forward multiple
-            multiple = EV/self.fin['ebitda'].iloc[1]
-            for i in range(self.year-1):
-                if i == 0:
-                    self.fin['buybacks'].iloc[i+1] = self.fin['fcfe'].iloc[i+1] + \
-                        self.fin['cash'].iloc[0] - \
-                        self.fin['dividend_policy'].iloc[i+1]
-                    self.fin['shares'].iloc[i+1] = self.fin['shares'].iloc[i] - \
-                        self.fin['buybacks'].iloc[i+1] / \
-                        self.fin['price'].iloc[i]
-                else:
-                    self.fin['buybacks'].iloc[i+1] = self.fin['fcfe'].iloc[i +
-                                                                           1] - self.fin['dividend_policy'].iloc[i+1]
-                    self.fin['shares'].iloc[i+1] = self.fin['shares'].iloc[i] - \
-                        self.fin['buybacks'].iloc[i+1] / \
-                        self.fin['price'].iloc[i]
-                # calculate the new price
-                # no need to include cash, since cash is being used fully for buybacks or dividend
-                self.fin['price'].iloc[i+1] = max((multiple*self.fin['ebitda'].iloc[i+2] - self.fin['debt'].iloc[i+1])/self.fin['shares'].iloc[i+1],self.fin['price'].iloc[i])
-                
-            self.fin['price'].iloc[-1] = self.fin['price'].iloc[-2]
-            self.fin['shares'].iloc[-1] = self.fin['shares'].iloc[-2] - self.fin['buybacks'].iloc[-1] / self.fin['price'].iloc[-1]
-
-        self.fin['dividend'] = (
-            self.fin['fcfe']-self.fin['buybacks'])/self.fin['shares']
-        self.fin['dividend'].iloc[0] = self.dividend[0]
-        self.fin['dividend'].iloc[1] = (
-            self.fin['fcfe'].iloc[1]+self.cash0-self.fin['buybacks'].iloc[1])/self.fin['shares'].iloc[1]
+        if dp in ['constant', 'proportional']:
+            # the last year isn't bought back with a proportional price
+            n = self.year if dp == 'constant' else self.year-1
+            buybacks[1:n+1] = fcfe[1:n+1] - policy[1:n+1]
+            buybacks[1] = buybacks[1] + col['cash'][0]
+            shares, prices, _ = engine.allocate(price, shares[0], buybacks, fcfe, col['cash'][0], dp,
+                                                col['ebitda'], col['debt'])
+            if dp == 'proportional':
+                self.fin['price'] = prices
+            self.fin['buybacks'] = buybacks
+            self.fin['shares'] = shares
+
+        dividend = (fcfe-buybacks)/shares
+        dividend[0] = self.dividend[0]
+        dividend[1] = (fcfe[1]+self.cash0-buybacks[1])/shares[1]
+        self.fin['dividend'] = dividend
         self.cash0 = 0  # all used for buybacks, you need to zero it so that it's not double counted in the valuation for the DDM model
         self.buybacks = True
-        logging.info('fcf_to_buyback() method complete')
+        self.__touch('buybacks', 1)
+        self.__touch('shares', 1)
+        self.log.info('fcf_to_buyback() method complete')
+
+    def __buyback_amounts(self, buybacks, fcf):
+        '''yearly buybacks from the amounts of the first years, the last
+        amount is then grown with the fcf
+
+        Args:
+            buybacks: list of amounts
+            fcf: yearly fcf
+
+        Returns:
+            bb: array of the yearly buybacks
+        '''
+        n_bb = len(buybacks)
+        bb = np.zeros(self.year+1)
+        for i in range(self.year+1):
+            if (i < n_bb):
+                bb[i] = buybacks[i]
+            else:
+                bb[i] = buybacks[n_bb-1]/fcf[n_bb-1]*fcf[i]
+        return bb
 
     def fcf_to_allocate(self, price, dp='proportional', buybacks=None):
         '''A generalized method for allocating cash to dividends, buybacks or
@@ -672,39 +1003,120 @@ class company:
         if buybacks is None:  # all FCF not used for dividends are used for BB's
             self.fcf_to_buyback(price, dp)
         else:  # set a specific BB level and accumulate the remaing cash onto the BS
-            self.fin['buybacks'] = 0
-            n_bb = len(self.buybacks)
-            for i in range(self.year+1):
-                if (i < n_bb):
-                    self.fin['buybacks'].iloc[i] = self.buybacks[i]
-                else:
-                    self.fin['buybacks'].iloc[i] = self.buybacks[n_bb-1] / \
-                        self.fin['fcf'].iloc[n_bb-1]*self.fin['fcf'].iloc[i]
+            col = self.__columns()
+            bb = self.__buyback_amounts(self.buybacks, col['fcf'])
+            self.fin['buybacks'] = bb
 
             # calculate price and shares
             self.fin['price'] = price
-            if dp == 'constant':
-                for i in range(self.year):
-                    self.fin['shares'].iloc[i+1] = self.fin['shares'].iloc[i] - \
-                        self.fin['buybacks'].iloc[i+1] / \
-                        self.fin['price'].iloc[i]
-            elif dp == 'proportional':
-                EV = price*self.shares + \
-                    self.fin['debt'].iloc[0]-self.fin['cash'].iloc[0]
-                # calculate the forward multiple
-                multiple = EV/self.fin['ebitda'].iloc[1]
-                for i in range(self.year-1):
-                    self.fin['shares'].iloc[i+1] = self.fin['shares'].iloc[i] - \
-                        self.fin['buybacks'].iloc[i+1] / \
-                        self.fin['price'].iloc[i]
-                    # no need to include cash, since cash is being used fully for buybacks or dividend
-                    self.fin['price'].iloc[i+1] = max((multiple*self.fin['ebitda'].iloc[i+2] - self.fin['debt'].iloc[i+1])/self.fin['shares'].iloc[i+1],self.fin['price'].iloc[i])
-                #self.fin['shares'].iloc[-1] = self.fin['shares'].iloc[-2]
-                self.fin['price'].iloc[-1] = self.fin['price'].iloc[-2]
-                self.fin['shares'].iloc[-1] = self.fin['shares'].iloc[-2] - self.fin['buybacks'].iloc[-1] / self.fin['price'].iloc[-1]
+            if dp in ['constant', 'proportional']:
+                shares, prices, _ = engine.allocate(price, col['shares'][0], bb, col['fcfe'], col['cash'][0], dp,
+                                                    col['ebitda'], col['debt'])
+                if dp == 'proportional':
+                    self.fin['price'] = prices
+                self.fin['shares'] = shares
 
         self.fcf_to_bs()
         self.buybacks = True
+        self.__touch('buybacks', 1)
+        self.__touch('shares', 1)
+
+    def simulate_allocation(self, price, paths=10000, model='gbm', sigma=0.3, mu=0, theta=0.2, buybacks=None,
+                            seed=None):
+        '''the buyback allocation of fcf_to_allocate() for many simulated share
+        price paths at once
+
+        The shares bought back, the dividends and the DDM value per share are
+        calculated for every path with the array engine. The fin dataframe is
+        not changed, the capital allocation isn't modelled yet.
+
+        Args:
+            price: share price today
+            paths: number of simulated paths
+            model: 'gbm' for a geometric brownian motion of the share price,
+            'multiple' for a forward EV/EBITDA multiple which reverts to
+            todays value
+            sigma: annual volatility of the price or the multiple
+            mu: annual drift of the price, for 'gbm'
+            theta: annual rate at which the multiple reverts, for 'multiple'
+            buybacks: None to use all FCF not used for dividends for
+            buybacks, otherwise the amounts as in fcf_to_allocate(), the
+            remaining cash is stored on the balance sheet
+            seed: seed of the random generator
+
+        Returns:
+            table: a dataframe with one row per path with the 'price' and
+            'shares' in the final year, the 'value_per_share_DDM' in year 0
+            and the 'excess' over the value per share without buybacks, when
+            all FCFE is paid as dividends
+        '''
+        if self.data_for_ebitda is False:
+            self.log.error('financial dataset cannot be used for the DDM')
+            return None
+
+        re, rd, gt = self.__rate(self.re), self.__rate(self.rd), self.__rate(self.gt)
+        col = self.__columns()
+        fcfe, policy = col['fcfe'], col['dividend_policy']
+        shares0, cash = col['shares'][0], col['cash'][0]
+        if buybacks is None:
+            bb = np.zeros(self.year+1)
+            bb[1:] = fcfe[1:] - policy[1:]
+            bb[1] = bb[1] + cash
+        else:
+            bb = self.__buyback_amounts(list(np.atleast_1d(buybacks)), col['fcf'])
+
+        rng = np.random.default_rng(seed)
+        sigma = sigma/np.sqrt(self.periods)
+        if model == 'gbm':
+            prices = engine.gbm(price, paths, self.year, sigma, mu/self.periods, rng)
+            shares, prices, dividend = engine.allocate(prices, shares0, bb, fcfe, cash, 'path')
+        elif model == 'multiple':
+            multiple = (price*shares0 + col['debt'][0]-cash)/col['ebitda'][1]
+            multiples = engine.mean_reverting(multiple, paths, self.year, sigma, theta/self.periods, rng)
+            shares, prices, dividend = engine.allocate(price, shares0, bb, fcfe, cash, 'multiple',
+                                                       col['ebitda'], col['debt'], multiples)
+        else:
+            raise ValueError("model must be 'gbm' or 'multiple', not {!r}".format(model))
+
+        cashBS = np.zeros(self.year+1)
+        if buybacks is not None:
+            # the cash which isn't bought back is distributed the final year,
+            # as fcf_to_bs()
+            cashBS[0] = cash
+            cashBS[1:] = cash + np.cumsum(fcfe[1:] - policy[1:] - bb[1:])
+            dividend = policy/shares
+            dividend[:, -1] = dividend[:, -1] + cashBS[-1]/shares[:, -1]
+
+        inputs = {'fcf': col['fcf'], 'fcfe': fcfe, 'fcff': col['fcff'], 'dDebt': col['dDebt'], 'debt': col['debt'],
+                  'noa': col['noa'], 'cash': col['cash'], 'cash0': 0, 'shares0': self.shares,
+                  're': re, 'rd': rd, 't': self.t, 'gt': gt}
+        value = engine.value(dividend=dividend, shares=shares, cashBS=cashBS, **inputs)['value_per_share_DDM'][:, 0]
+        # without buybacks all FCFE and the cash are paid as dividends
+        dividend = fcfe/shares0
+        dividend[1] = dividend[1] + cash/shares0
+        base = engine.value(dividend=dividend, shares=np.full(self.year+1, shares0), cashBS=np.zeros(self.year+1),
+                            **inputs)['value_per_share_DDM'][0]
+
+        table = pd.DataFrame({'price': prices[:, -1], 'shares': shares[:, -1],
+                              'value_per_share_DDM': value, 'excess': value-base})
+        self.log.info('simulate_allocation() method complete')
+        return table
+
+    def __acquisition(self, year_a, ebitda_frac, gnext, cap_frac):
+        '''change in EBITDA and capex from an acquisition in year_a
+
+        Args:
+            year_a: year of the acquisition
+            ebitda_frac: EBITDA of the target, relative to the organic ebitda
+            gnext: next years growth
+            cap_frac: capex of the target as a fraction of its EBITDA
+
+        Returns:
+            dEbitda, dCapex:
+        '''
+        dEbitda = self.__columns()['ebitda'][year_a] * \
+            engine.acquisition_ebitda(year_a, ebitda_frac, gnext, self.__rate(self.gt), self.year)
+        return dEbitda.tolist(), cap_frac*dEbitda
 
     def fcf_to_acquire(self, adjust_cash, year_a=1, ebitda_frac=0.1, multiple=10, leverage=3, gnext=0.1, cap_frac=0.2):
         '''include the effect of an acquistion in the financial model
@@ -730,39 +1142,129 @@ class company:
         '''
 
         if self.data_for_ebitda is False:
-            logging.error('financial dataset cannot be used to acquire')
+            self.log.error('financial dataset cannot be used to acquire')
         if self.fin['fcf'].empty:
-            logging.error('first calculate fcf')
+            self.log.error('first calculate fcf')
 
-        g = [ebitda_frac-1, gnext]
-        for i in range(year_a):
-            g.insert(0, 0)
-        dEbitda = self.forecast_ebitda(self.fin['ebitda'].iloc[year_a], g)
-        for i in range(year_a+1):
-            dEbitda[i] = 0
-
-        dCapex = cap_frac*np.array(dEbitda)
-        dDebt = [leverage*dEbitda[year_a+1] if x >=
+        dEbitda, dCapex = self.__acquisition(year_a, ebitda_frac, gnext, cap_frac)
+        # leverage and multiple are on the annualized ebitda
+        dDebt = [leverage*self.periods*dEbitda[year_a+1] if x >=
                  year_a else 0 for x in range(self.year+1)]
         self.fin['debt'] = self.fin['debt']+dDebt
-        self.fin['MnA'].iloc[year_a] = self.fin['MnA'].iloc[year_a] + \
-            multiple*dEbitda[year_a+1]
+        self.__own('MnA', 'da', 'cash')
+        self.fin.iloc[year_a, self.fin.columns.get_loc('MnA')] = self.fin['MnA'].iloc[year_a] + \
+            multiple*self.periods*dEbitda[year_a+1]
         self.fin['capex'] = self.fin['capex']+dCapex
         self.fin['ebitda'] = self.fin['ebitda']+dEbitda
         # reset the depreciation so that it gets recalculated from fcf_from_ebitda
-        self.fin['da'].iloc[year_a+1:] = np.nan
+        self.fin.iloc[year_a+1:, self.fin.columns.get_loc('da')] = np.nan
+        self.n_da = np.count_nonzero(~np.isnan(self.fin['da'].to_numpy(dtype=float)))
 
         if year_a == 0 and adjust_cash is True:
             # adjust the cash balance in year 0 to pay for the acquisition
-            self.fin['cash'].iloc[0] = self.fin['cash'].iloc[0] - \
-                (multiple-leverage)*dEbitda[1]
+            self.fin.iloc[0, self.fin.columns.get_loc('cash')] = self.fin['cash'].iloc[0] - \
+                (multiple-leverage)*self.periods*dEbitda[1]
             self.cash0 = self.fin['cash'].iloc[0]
+            self.__touch('cash', 0)
 
         if self.fin['cash'].iloc[year_a] < 0:
-            logging.error('cash<0, insufficient cash for the aquisition; lower the EBITDA or increase the leverage')
+            self.log.error('cash<0, insufficient cash for the aquisition; lower the EBITDA or increase the leverage')
+
+        for column in ['ebitda', 'capex', 'da']:
+            self.__touch(column, year_a+1)
+        self.__touch('debt', year_a)
+        self.__touch('MnA', year_a)
+        self.__update()
+        self.log.info('fcf_to_acquire() method complete')
+
+        return dEbitda
+
+    def fcf_to_acquire_program(self, year_a, ebitda_frac=0.1, multiple=10, leverage=3, gnext=0.1, cap_frac=0.2,
+                               adjust_cash=False):
+        '''include a program of acquisitions in the financial model
+
+        Gives the same results as calling fcf_to_acquire() for each deal in
+        order, but the EBITDA, capex, debt and MnA of all the deals are added
+        as one overlay and the FCF's are recalculated once. Each deal is sized
+        on the EBITDA including the earlier deals of the program.
+
+        Args:
+            year_a: year of each acquisition, a list
+            ebitda_frac: EBITDA of the target, relative to the ebitda, a list
+            or one value for all deals
+            multiple: EV/EBITDA multiple of each acquisition
+            leverage: Debt/EBITDA leverage target of each acquisition
+            gnext: next years growth of each target
+            cap_frac: capex of each target as a fraction of its EBITDA
+            adjust_cash: adjust cash balance in year 0 for the deals in year 0
+
+        Returns:
+            dEbitda: array of shape (deals, year+1) with the change in EBITDA
+            of each acquisition
+        '''
+        if self.data_for_ebitda is False:
+            self.log.error('financial dataset cannot be used to acquire')
+        if self.fin['fcf'].empty:
+            self.log.error('first calculate fcf')
+
+        year_a, ebitda_frac, multiple, leverage, gnext, cap_frac, adjust_cash = (
+            np.atleast_1d(x) for x in np.broadcast_arrays(
+                year_a, ebitda_frac, multiple, leverage, gnext, cap_frac, adjust_cash))
+        year_a = year_a.astype(int)
+        gt = self.__rate(self.gt)
+        # EBITDA of each target per unit of the ebitda in its year
+        unit = engine.acquisition_ebitda(year_a, ebitda_frac, gnext, gt, self.year)
+
+        col = self.__columns()
+        ebitda = col['ebitda'].copy()
+        capex = col['capex'].copy()
+        da = col['da'].copy()
+        dEbitda = np.empty_like(unit)
+        years = np.arange(self.year+1)
+        n_da = self.n_da
+        for k, a in enumerate(year_a):
+            dEbitda[k] = ebitda[a]*unit[k]
+            ebitda += dEbitda[k]
+            capex += cap_frac[k]*dEbitda[k]
+            da[a+1:] = np.nan
+            n_da = np.count_nonzero(~np.isnan(da))
+            if k < len(year_a)-1:
+                # the depreciation interpolated after each deal is the start
+                # of the next one
+                dat = engine.terminal_da(capex[-1], ebitda[-1], gt, self.roict/self.periods, self.t)
+                da = engine.stream(da[:n_da], dat, self.year)
+
+        run_rate = self.periods*dEbitda[np.arange(len(year_a)), year_a+1]
+        dDebt = np.where(years >= year_a[:, None], (leverage*run_rate)[:, None], 0).sum(axis=0)
+        dMnA = np.zeros(self.year+1)
+        np.add.at(dMnA, year_a, multiple*run_rate)
+
+        self.fin['debt'] = col['debt']+dDebt
+        self.fin['MnA'] = col['MnA']+dMnA
+        self.fin['capex'] = capex
+        self.fin['ebitda'] = ebitda
+        self.fin['da'] = da
+        self.n_da = n_da
+
+        cash = (year_a == 0) & adjust_cash.astype(bool)
+        if cash.any():
+            # adjust the cash balance in year 0 to pay for the acquisitions
+            self.__own('cash')
+            self.fin.iloc[0, self.fin.columns.get_loc('cash')] = self.fin['cash'].iloc[0] - \
+                ((multiple-leverage)*run_rate)[cash].sum()
+            self.cash0 = self.fin['cash'].iloc[0]
+            self.__touch('cash', 0)
+
+        if (self.fin['cash'].to_numpy(dtype=float)[year_a] < 0).any():
+            self.log.error('cash<0, insufficient cash for the aquisition; lower the EBITDA or increase the leverage')
 
-        self.fcf_from_ebitda()
-        logging.info('fcf_to_acquire() method complete')
+        first = year_a.min()
+        for column in ['ebitda', 'capex', 'da']:
+            self.__touch(column, first+1)
+        self.__touch('debt', first)
+        self.__touch('MnA', first)
+        self.__update()
+        self.log.info('fcf_to_acquire_program() method complete')
 
         return dEbitda
 
@@ -778,13 +1280,16 @@ class company:
 
         Returns:
         '''
-        self.fin['MnA'].iloc[year_dis] = self.fin['MnA'].iloc[year_dis] - \
+        self.__own('MnA')
+        self.fin.iloc[year_dis, self.fin.columns.get_loc('MnA')] = self.fin['MnA'].iloc[year_dis] - \
             dnoa*(1-tax)
         self.fin['noa'] = self.fin['noa'] - dnoa
-        self.fcf_from_ebitda()
-        logging.info('dispose_from_noa() method complete')
+        self.__touch('MnA', year_dis)
+        self.__touch('noa', 0)
+        self.__update()
+        self.log.info('dispose_from_noa() method complete')
 
-    def value(self):
+    def value(self, derivatives=False):
         '''calculate the firm and equity values
 
         Firm value is calculated as the DCF of the FCFF. Equity value is
@@ -795,6 +1300,8 @@ class company:
         Results from the analysis are used to populate the 'fin' dataframe.
 
         Args:
+            derivatives: also calculate the first derivatives of the value per
+            share in year 0, stored in self.derivatives, see __derivatives()
 
         Returns:
             self.fin['equity']: DCF of the FCFE
@@ -802,85 +1309,458 @@ class company:
 
         '''
 
+        re, rd, gt = self.__rate(self.re), self.__rate(self.rd), self.__rate(self.gt)
         if self.data_for_ebitda is True:
             # really complicated way to calculate the terminal FCFE for situtions...
             # ...where there is terminal growth and you have changes in debt the final year before terminal.
             # If no change in debt and no growth the fcfet = fcfe = fcf in the terminal year
             self.fcfet = (self.fin['fcf'].iloc[-1]-self.fin['dDebt'].iloc[-1]
-                          * self.rd+self.fin['debt'].iloc[-1]*self.gt)*(1+self.gt)
+                          * rd+self.fin['debt'].iloc[-1]*gt)*(1+gt)
 
             self.fin['equity'] = self.__pv(
-                cfs=self.fin.fcfe, cft=self.fcfet, g=self.gt, r=self.re)
+                cfs=self.fin.fcfe, cft=self.fcfet, g=gt, r=re)
             self.__wacc()
             self.fin['firm'] = self.__pv(
-                cfs=self.fin.fcff, g=self.gt, r=self.fin.wacc)
+                cfs=self.fin.fcff, g=gt, r=self.fin.wacc)
             self.fin['DDM'] = self.__pv(
-                cfs=self.fin.dividend, cft=self.fcfet/self.fin['shares'].iloc[-1], g=self.gt, r=self.re)
+                cfs=self.fin.dividend, cft=self.fcfet/self.fin['shares'].iloc[-1], g=gt, r=re)
 
             # adjustments for cash and non-operating assets
             self.fin['value_per_share'] = (
                 self.fin['equity']+self.fin['noa'])/self.shares
-            self.fin['value_per_share'].iloc[0] = self.fin['value_per_share'].iloc[0] + \
+            self.fin.iloc[0, self.fin.columns.get_loc('value_per_share')] = self.fin['value_per_share'].iloc[0] + \
                 self.fin['cash'].iloc[0]/self.shares
             self.fin['value_per_share_DDM'] = self.fin['DDM'] + \
                 self.fin['noa']/self.fin['shares']
-            self.fin['value_per_share_DDM'].iloc[0] = self.fin['value_per_share_DDM'].iloc[0] + \
+            self.fin.iloc[0, self.fin.columns.get_loc('value_per_share_DDM')] = self.fin['value_per_share_DDM'].iloc[0] + \
                 self.cash0/self.fin['shares'].iloc[0]
-            self.fin['value_per_share_DDM'].iloc[-1] = self.fin['value_per_share_DDM'].iloc[-1] + \
+            self.fin.iloc[-1, self.fin.columns.get_loc('value_per_share_DDM')] = self.fin['value_per_share_DDM'].iloc[-1] + \
                 self.fin['cashBS'].iloc[-1]/self.fin['shares'].iloc[-1]
         else:
             self.fin['equity'] = self.__pv(
-                cfs=self.fin.fcfe, g=self.gt, r=self.re)
+                cfs=self.fin.fcfe, g=gt, r=re)
             self.fin['firm'] = None
 
         if self.buybacks is True:
             # calculate value per share in buyback scenario, i.e. all cash used
             # to purchase shares until terminal year
             self.vpsbb = ((self.fin['equity'].iloc[-1]+self.fin['noa'].iloc[-1]
-                           )/self.fin['shares'].iloc[-1])/(1+self.re)**self.year
+                           )/self.fin['shares'].iloc[-1])/(1+re)**self.year
         else:
             self.vpsbb = 0
 
-        logging.info('value() method complete')
+        if derivatives is True:
+            self.derivatives = self.__derivatives()
+
+        self.log.info('value() method complete')
         return self.fin['equity'], self.fin['firm']
 
-    def display_fin(self):
+    def __derivatives(self, h=1e-20):
+        '''first derivatives of the value per share and the DDM value per share
+        in year 0 with respect to re, rd, gt, roict, t and the growth of the
+        ebitda forecast in each year
+
+        The derivatives are exact, they are taken with a complex step: each
+        input is moved by i*h and the derivative is the imaginary part of the
+        value divided by h. All inputs are one batch of scenarios of the array
+        engine, so it costs about one more pass. As in value_batch() the
+        FCF's are recalculated with the forecasts and capital allocation
+        decisions held constant. The growth in year k scales the ebitda of
+        year k onwards, capex keeps its fraction of ebitda.
+
+        Args:
+            h: size of the complex step
+
+        Returns:
+            derivatives: dataframe indexed by the input ('re', 'rd', 'gt',
+            'roict', 't', 'g1', ..., 'g<year>') with a column for the
+            value_per_share and the value_per_share_DDM
+        '''
+        if self.data_for_ebitda is False:
+            self.log.error('financial dataset cannot be used for the derivatives')
+            return None
+
+        rates = ['re', 'rd', 'gt', 'roict', 't']
+        names = rates + ['g{}'.format(k+1) for k in range(self.year)]
+        x = {}
+        for i, key in enumerate(rates):
+            x[key] = np.full(len(names), float(getattr(self, key)), dtype=complex)
+            x[key][i] = x[key][i] + 1j*h
+
+        # ebitda[j] = ebitda[k-1]*(1+g[k])*...*(1+g[j]), so the step on g[k]
+        # scales the years from k by 1+i*h/(1+g[k])
+        col = self.__columns()
+        ebitda = col['ebitda']
+        step = np.zeros((len(names), self.year+1), dtype=complex)
+        later = np.arange(self.year+1) >= np.arange(1, self.year+1)[:, None]
+        step[len(rates):] = np.where(later, 1j*h*(ebitda[:-1]/ebitda[1:])[:, None], 0)
+        values = self.__scenarios(re=x['re'], rd=x['rd'], gt=x['gt'], roict=x['roict'], t=x['t'],
+                                  ebitda=ebitda*(1+step), capex=col['capex']*(1+step))
+
+        return pd.DataFrame({key: values[key][:, 0].imag/h for key in ['value_per_share', 'value_per_share_DDM']},
+                            index=pd.Index(names, name='x'))
+
+    def value_batch(self, re=None, rd=None, gt=None, roict=None, t=None, grid=False):
+        '''value the company for arrays of discount rate, growth and ROIC
+        assumptions in one call
+
+        The FCF's are recalculated with the array engine for every scenario at
+        once, followed by the firm, equity and DDM values. Forecasts and
+        capital allocation decisions already in the fin dataframe (ebitda,
+        capex, debt, MnA, buybacks and shares) are held constant, changes in
+        FCFE relative to the current model are paid out as dividends.
+        Assumptions which are not provided are taken from the attributes.
+
+        Args:
+            re: cost of equity, float or array
+            rd: cost of debt, float or array
+            gt: terminal growth, float or array
+            roict: terminal return on invested capital, float or array
+            t: marginal tax rate, float or array
+            grid: if True the assumptions are combined as a grid (every
+            combination), otherwise they are broadcast against each other
+
+        Returns:
+            table: a dataframe with one row per scenario with the assumptions,
+            and the equity, firm, DDM, value_per_share and value_per_share_DDM
+            in year 0
+        '''
+        params = {'re': re, 'rd': rd, 'gt': gt, 'roict': roict, 't': t}
+        params = {key: np.atleast_1d(np.asarray(getattr(self, key) if value is None else value, dtype=float))
+                  for key, value in params.items()}
+        if grid is True:
+            params = dict(zip(params, np.meshgrid(*params.values(), indexing='ij')))
+        params = dict(zip(params, [p.ravel() for p in np.broadcast_arrays(*params.values())]))
+        re, rd, gt, roict, t = params.values()
+        table = pd.DataFrame(params)
+
+        if self.data_for_ebitda is True:
+            values = self.__scenarios(re=re, rd=rd, gt=gt, roict=roict, t=t)
+            for key in ['equity', 'firm', 'DDM', 'value_per_share', 'value_per_share_DDM']:
+                table[key] = values[key][:, 0]
+        else:
+            table['equity'] = engine.pv(self.__columns()['fcfe'], self.__rate(re)[:, None],
+                                        self.__rate(gt))[:, 0]
+            for key in ['firm', 'DDM', 'value_per_share', 'value_per_share_DDM']:
+                table[key] = np.nan
+
+        self.log.info('value_batch() method complete')
+        return table
+
+    def sensitivity(self, x, x_values, y, y_values, target='value_per_share', acquisition=None,
+                    sheet=None):
+        '''two way sensitivity table of the value, e.g. re x gt or the
+        multiple x leverage of an acquisition
+
+        All combinations are calculated at once with the array engine from the
+        forecasts already in the fin dataframe, see value_batch(). The deal
+        terms 'multiple' and 'leverage' are those of an acquisition which is
+        added to the current model as by fcf_to_acquire(), without running the
+        fcf_to_X() methods again afterwards.
+
+        Args:
+            x, y: parameters of the rows and columns, one of 're', 'rd', 'gt',
+            'roict', 't', 'multiple' or 'leverage'
+            x_values, y_values: values of the parameters
+            target: 'value_per_share', 'value_per_share_DDM', 'equity', 'firm'
+            or 'DDM'
+            acquisition: dict of the fcf_to_acquire() arguments (year_a,
+            ebitda_frac, multiple, leverage, gnext, cap_frac, adjust_cash),
+            required for a sweep of the deal terms
+            sheet: name of a sheet, if provided the table is added to the
+            report by display_fin()
+
+        Returns:
+            table: dataframe of the target in year 0, x in the rows and y in
+            the columns, a ValueError is raised for an unknown parameter
+        '''
+        rates = ['re', 'rd', 'gt', 'roict', 't']
+        terms = ['multiple', 'leverage']
+        if x not in rates+terms or y not in rates+terms:
+            raise ValueError('sensitivity() parameters must be one of {}'.format(', '.join(rates+terms)))
+        if self.data_for_ebitda is False:
+            raise ValueError('financial dataset cannot be used for a sensitivity analysis')
+
+        xv, yv = np.meshgrid(np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float),
+                             indexing='ij')
+        params = {key: np.full(xv.size, float(getattr(self, key))) for key in rates}
+        params[x] = xv.ravel()
+        params[y] = yv.ravel()
+
+        overlay = {}
+        if acquisition is not None or x in terms or y in terms:
+            deal = {'year_a': 1, 'ebitda_frac': 0.1, 'multiple': 10, 'leverage': 3,
+                    'gnext': 0.1, 'cap_frac': 0.2, 'adjust_cash': False}
+            deal.update(acquisition or {})
+            year_a = deal['year_a']
+            multiple = params.get('multiple', np.full(xv.size, float(deal['multiple'])))
+            leverage = params.get('leverage', np.full(xv.size, float(deal['leverage'])))
+            dEbitda, dCapex = self.__acquisition(year_a, deal['ebitda_frac'], deal['gnext'],
+                                                 deal['cap_frac'])
+            dEbitda = np.asarray(dEbitda, dtype=float)
+            # leverage and multiple are on the annualized ebitda
+            run_rate = self.periods*dEbitda
+            after = np.arange(self.year+1) >= year_a
+            col = self.__columns()
+            overlay['ebitda'] = col['ebitda'] + dEbitda
+            overlay['capex'] = col['capex'] + dCapex
+            overlay['debt'] = col['debt'] + \
+                (leverage*run_rate[year_a+1])[:, None]*after
+            overlay['MnA'] = np.repeat(col['MnA'][None, :], xv.size, axis=0)
+            overlay['MnA'][:, year_a] += multiple*run_rate[year_a+1]
+            overlay['n_da'] = year_a+1
+            if year_a == 0 and deal['adjust_cash'] is True:
+                overlay['cash0'] = col['cash'][0] - (multiple-leverage)*run_rate[1]
+
+        values = self.__scenarios(re=params['re'], rd=params['rd'], gt=params['gt'],
+                                  roict=params['roict'], t=params['t'], **overlay)
+        table = pd.DataFrame(values[target][:, 0].reshape(xv.shape),
+                             index=pd.Index(xv[:, 0], name=x), columns=pd.Index(yv[0], name=y))
+        if sheet is not None:
+            self.sensitivities[sheet] = table
+
+        self.log.info('sensitivity() method complete')
+        return table
+
+    def __growth_paths(self, gf, gt, cap_frac=None):
+        '''ebitda and capex forecasts for a batch of growth rates, the same
+        as forecast_ebitda() for each row
+
+        Args:
+            gf: ebitda growth rates, shape (paths, n)
+            gt: terminal growth, shape (paths,)
+            cap_frac: capex as a fraction of ebitda, shape (paths,), if None
+            capex keeps the current fraction of ebitda in each year
+
+        Returns:
+            ebitda, capex: arrays of shape (paths, year+1)
+        '''
+        col = self.__columns()
+        ebitda_ttm = col['ebitda'][0]
+        capex0 = col['capex']
+        growth = engine.stream(gf, self.__rate(gt), self.year)
+        ebitda = np.empty(growth.shape)
+        ebitda[:, 0] = ebitda_ttm
+        ebitda[:, 1:] = ebitda_ttm*np.cumprod(1+growth[:, :-1], axis=1)
+        if cap_frac is None:
+            capex = capex0/col['ebitda']*ebitda
+        else:
+            capex = np.asarray(cap_frac, dtype=float)[:, None]*ebitda
+        capex[:, 0] = capex0[0]
+        return ebitda, capex
+
+    def implied_growth(self, price, mode='uniform', gf=None, bracket=None, x0=None,
+                       tol=1e-6, max_iter=100, target='value_per_share'):
+        '''reverse DCF, solve for the growth which is priced in by the market
+
+        Finds the assumption for which the value per share equals the price.
+        In the 'uniform' and 'scale' modes the ebitda forecast is rebuilt from
+        the ttm ebitda as in forecast_ebitda(), with capex keeping its current
+        fraction of ebitda. Debt and capital allocation decisions in the fin
+        dataframe are held constant. Several prices are solved at once.
+
+        Args:
+            price: share price, float or array
+            mode: 'uniform' = a single growth rate which fades to gt,
+            'scale' = a multiple of the growth rates gf,
+            'roict' = the terminal return on invested capital
+            gf: growth rates which are scaled in the 'scale' mode
+            bracket: (lo, hi) limits for the solution, by default (-0.5, 1.0)
+            for 'uniform', (-5, 5) for 'scale' and (0.05, 5) for 'roict'
+            x0: warm start, e.g. a previous solution
+            tol: tolerance on the value per share
+            max_iter: maximum number of iterations of the solver
+            target: 'value_per_share' or 'value_per_share_DDM'
+
+        Returns:
+            implied: the solution, a float or an array for an array of prices,
+            nan where the bracket doesn't contain a solution
+        '''
+        if self.data_for_ebitda is False:
+            self.log.error('financial dataset cannot be used for a reverse DCF')
+
+        price = np.asarray(price, dtype=float)
+        prices = np.atleast_1d(price)
+        if bracket is None:
+            bracket = {'uniform': (-0.5, 1.0), 'scale': (-5, 5), 'roict': (0.05, 5)}[mode]
+        gt = np.full(prices.shape, float(self.gt))
+
+        def f(x):
+            if mode == 'roict':
+                values = self.__scenarios(re=self.re, rd=self.rd, gt=gt, roict=x, t=self.t)
+            else:
+                if mode == 'uniform':
+                    g = x[:, None]
+                else:
+                    g = x[:, None]*np.asarray(gf, dtype=float)
+                ebitda, capex = self.__growth_paths(g, gt)
+                values = self.__scenarios(re=self.re, rd=self.rd, gt=gt, roict=self.roict, t=self.t,
+                                          ebitda=ebitda, capex=capex)
+            return values[target][:, 0] - prices
+
+        x, fx, converged, iterations = engine.root(
+            f, np.full(prices.shape, float(bracket[0])), np.full(prices.shape, float(bracket[1])),
+            x0=x0, tol=tol, max_iter=max_iter)
+        if not np.all(converged):
+            self.log.warning('implied_growth() did not converge for %d of %d prices',
+                            np.count_nonzero(~converged), converged.size)
+        self.implied_report = {'implied': x, 'residual': fx, 'converged': converged,
+                               'iterations': iterations}
+        self.log.info('implied_growth() method complete')
+        return x.reshape(price.shape)[()] if price.ndim == 0 else x
+
+    def __draw(self, dist, rng, n):
+        '''draw n samples from a distribution
+
+        Args:
+            dist: a float (constant), a function f(rng, n) or a frozen
+            scipy.stats distribution
+            rng: numpy random generator
+            n: number of samples
+
+        Returns:
+            samples: array of size n
+        '''
+        if hasattr(dist, 'rvs'):
+            samples = dist.rvs(size=n, random_state=rng)
+        elif callable(dist):
+            samples = dist(rng, n)
+        else:
+            samples = dist
+        return np.broadcast_to(np.asarray(samples, dtype=float), (n,))
+
+    def simulate(self, gf, n=100000, gt=None, re=None, cap_frac=None, seed=None,
+                 quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), chunk=20000):
+        '''Monte Carlo valuation over ebitda growth paths
+
+        The growth rates passed to forecast_ebitda(), the terminal growth, the
+        cost of equity and the capex fraction are sampled from the provided
+        distributions. The ebitda forecast of every path is grown from the ttm
+        ebitda and pushed through the FCF and value calculations as a
+        (paths x years) array. The remaining forecasts, debt and capital
+        allocation decisions in the fin dataframe are held constant.
+
+        A distribution can be a float (constant), a function f(rng, n) which
+        returns n samples, or a frozen scipy.stats distribution.
+
+        Args:
+            gf: list of distributions for the ebitda growth rates, one for each
+            forecast year, or a function f(rng, n) returning an array of shape
+            (n, len(gf))
+            n: number of paths
+            gt: distribution of the terminal growth, default is self.gt
+            re: distribution of the cost of equity, default is self.re
+            cap_frac: distribution of capex as a fraction of ebitda, if None
+            capex keeps the current fraction of ebitda in each year
+            seed: seed for the random generator
+            quantiles: quantiles reported in the summary
+            chunk: number of paths calculated at once, limits memory use
+
+        Returns:
+            samples: dataframe with the sampled assumptions and the value per
+            share of every path
+            summary: the quantiles, mean and standard deviation of the value
+            per share
+        '''
+        if self.data_for_ebitda is False:
+            self.log.error('financial dataset cannot be used for a simulation')
+
+        rng = np.random.default_rng(seed)
+        if callable(gf) and not isinstance(gf, list):
+            g = np.asarray(gf(rng, n), dtype=float)
+        else:
+            g = np.column_stack([self.__draw(dist, rng, n) for dist in gf])
+        samples = pd.DataFrame({'g'+str(i+1): g[:, i] for i in range(g.shape[1])})
+        samples['gt'] = self.__draw(self.gt if gt is None else gt, rng, n)
+        samples['re'] = self.__draw(self.re if re is None else re, rng, n)
+        if cap_frac is not None:
+            samples['cap_frac'] = self.__draw(cap_frac, rng, n)
+
+        vps = np.empty(n)
+        vps_DDM = np.empty(n)
+        for start in range(0, n, chunk):
+            rows = slice(start, start+chunk)
+            gt_paths = samples['gt'].to_numpy()[rows]
+            ebitda, capex = self.__growth_paths(
+                g[rows], gt_paths, None if cap_frac is None else samples['cap_frac'].to_numpy()[rows])
+            values = self.__scenarios(re=samples['re'].to_numpy()[rows], rd=self.rd, gt=gt_paths,
+                                      roict=self.roict, t=self.t, ebitda=ebitda, capex=capex)
+            vps[rows] = values['value_per_share'][:, 0]
+            vps_DDM[rows] = values['value_per_share_DDM'][:, 0]
+        samples['value_per_share'] = vps
+        samples['value_per_share_DDM'] = vps_DDM
+
+        summary = samples[['value_per_share', 'value_per_share_DDM']].quantile(quantiles)
+        summary.loc['mean'] = samples[['value_per_share', 'value_per_share_DDM']].mean()
+        summary.loc['std'] = samples[['value_per_share', 'value_per_share_DDM']].std()
+        self.log.info('simulate() method complete')
+        return samples, summary
+
+    def display_fin(self, style=False, filename=None, template=None):
         '''populates a copy of the excel template file with a summary of the
         financial analysis contained in the fin dataframe.
 
+        The template is parsed once and reused for the following reports, see
+        report.template(). For many tickers in one workbook use
+        report.save_workbook().
+
         Args:
+            style: return the table as a formatted pandas Styler
+            filename: name of the excel file, default is '<ticker>.xlsx'
+            template: template file, default is company_template.xlsx
 
         Returns:
             table: a summary table of the financial analysis
         '''
-        table = self.fin[['revenue','ebitda', 'sbc', 'da', 'interest', 'income_pretax', 'nol', 'income_taxable', 'tax_cash', 'tax', 'capex', 'MnA', 'dDebt', 'dwc', 'fcf', 'fcfe', 'fcff',
-                          'buybacks', 'dividend', 'cash', 'cashBS', 'noa', 'equity', 'debt', 'EV', 'wacc', 'firm', 'shares', 'price', 'value_per_share', 'value_per_share_DDM']].T.style.format("{:.1f}")
+        report.save_report(self, filename=filename, path=template)
+        table = self.fin[report.TABLE].T
+        if style is True:
+            table = table.style.format("{:.1f}")
+        return table
 
-        wb = load_workbook(filename=os.path.join(
-            os.path.dirname(__file__), '..\\')+'company_template.xlsx')
-        ws = wb['raw data']
+    def to_dataset(self, root, run_date=None, fmt='parquet'):
+        '''append the fin dataframe and the scalar inputs to a columnar
+        dataset partitioned by run date and ticker. To write many companies
+        in batches use report.write_dataset().
 
-        for r in dataframe_to_rows(self.fin.T, index=True, header=True):
-            ws.append(r)
-        ws['A1'] = 'date'
+        Args:
+            root: folder of the dataset
+            run_date: date of the run, default is today
+            fmt: 'parquet' (requires pyarrow) or 'csv'
 
-        ws = wb['report']
-        ws['B2'] = self.ticker
-        ws['B3'] = self.now
-        ws['B4'] = 'David May'
+        Returns:
+            fmt: the format which was written
+        '''
+        return report.write_dataset([self], root, run_date=run_date, fmt=fmt)
 
-        ws['B6'] = self.rd
-        ws['B7'] = self.re
-        ws['B8'] = self.gt
-        ws['B9'] = self.t
+    def save(self, path):
+        '''write the calculated company to a binary file which load() reads
+        back without running any method
 
-        ws['B11'] = self.fin['cash'].iloc[-1]
-        ws['B12'] = self.fcfet
-        ws['B13'] = self.fin['equity'].iloc[-1]
-        ws['B15'] = self.shares
-        ws['B17'] = self.fin['value_per_share_DDM'].iloc[0]
+        The file has a json header with the scalar state (cash0, fcfet,
+        buybacks, dividend, vpsbb, the flags, ...) followed by the numeric
+        columns of fin as one float64 block.
 
-        ws2 = wb['report']
+        Args:
+            path: name of the file
+        '''
+        store.save(self, path)
+        self.log.info('saved to %s', path)
 
-        wb.save(self.ticker+'.xlsx')
-        return table
+    @classmethod
+    def load(cls, path, mmap=True, compact=False):
+        '''read a company written by save()
+
+        Args:
+            path: name of the file
+            mmap: memory map the columns of fin instead of reading them, the
+            map is copy-on-write so the file is never changed
+            compact: keep the columns in the compacted container instead of
+            building the fin dataframe, see compact()
+
+        Returns:
+            c: company
+        '''
+        c = store.load(path, cls, mmap=mmap, compact=compact)
+        c.log.info('loaded from %s', path)
+        return c
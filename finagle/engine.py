@@ -0,0 +1,658 @@
+'''Array engine for the company model.
+
+The functions in this module work on contiguous float64 numpy arrays where the
+last axis is the forecast year (year 0 is the ttm/baseline year). Any leading
+axes are treated as independent scenarios, so the same code path is used for
+a single company and for a batch of scenarios.
+'''
+import numpy as np
+
+
+def _array(x):
+    '''return x as a float64 array, or a complex128 array if it is complex
+    so that derivatives can be taken with a complex step, see
+    company.value()'''
+    return np.asarray(x, dtype=complex if np.iscomplexobj(x) else float)
+
+
+def _column(x):
+    '''return x as a float64 array with a trailing axis for broadcasting
+    against the yearly columns'''
+    return _array(x)[..., None]
+
+
+def period_rate(r, periods=1):
+    '''convert an annual rate to the compounded rate of one period
+
+    Args:
+        r: annual rate, e.g. a cost of capital or a growth rate
+        periods: number of periods in a year, 4 for quarters
+
+    Returns:
+        rate: (1+r)**(1/periods)-1, r itself for annual periods
+    '''
+    if periods == 1 or r is None:
+        return r
+    return (1+_array(r))**(1/periods)-1
+
+
+def stream(sf, st, year):
+    '''create a periodic stream of values by linear interpolation between the
+    forecasted values and the terminal value
+
+    Args:
+        sf: forecasted stream values for the first years, shape (..., n)
+        st: stream value in the terminal year, shape (...)
+        year: final forecast year
+
+    Returns:
+        values: array of shape (..., year+1)
+    '''
+    sf = _array(sf)
+    st = _array(st)
+    n = sf.shape[-1]
+    x = np.append(np.arange(n), year)
+    years = np.arange(year+1)
+    # the interpolation is linear in the input values, so build the weights
+    # once and apply them to every row
+    weights = np.stack([np.interp(years, x, e) for e in np.eye(n+1)])
+    lead = np.broadcast_shapes(sf.shape[:-1], st.shape)
+    s = np.concatenate([np.broadcast_to(sf, lead + (n,)),
+                        np.broadcast_to(st, lead)[..., None]], axis=-1)
+    return s @ weights
+
+
+def terminal_da(capex_t, ebitda_t, gt, roict, t):
+    '''calculate the depreciation in the terminal year
+
+    Enforces that Capex>=Depreciation so that assets continue to increase as
+    the company grows its bottom line.
+
+    Args:
+        capex_t: capex in the final forecast year
+        ebitda_t: ebitda in the final forecast year
+        gt: terminal growth
+        roict: terminal return on invested capital
+        t: marginal tax rate
+
+    Returns:
+        dat: terminal depreciation
+    '''
+    C = _array(gt)/roict*(1-_array(t))
+    return (capex_t-C*ebitda_t)/(1-C)
+
+
+def acquisition_ebitda(year_a, ebitda_frac, gnext, gt, year):
+    '''ebitda of acquired businesses per unit of the ebitda in the year of
+    the acquisition
+
+    The target has ebitda_frac of the acquirer's ebitda in the year after
+    the acquisition, grows by gnext the year after and then linearly towards
+    gt, like a growth forecast of company.forecast_ebitda().
+
+    Args:
+        year_a: year of each acquisition, shape (...)
+        ebitda_frac: ebitda of the target relative to the acquirer
+        gnext: growth of the target in the year after the acquisition
+        gt: terminal growth
+        year: final forecast year
+
+    Returns:
+        dEbitda: array of shape (..., year+1), 0 up to year_a
+    '''
+    a = np.asarray(year_a)[..., None]
+    gnext = _column(gnext)
+    gt = _column(gt)
+    i = np.arange(year)
+    # the interpolation of stream() between gnext in year_a+1 and gt in year
+    slope = (gt-gnext)/np.maximum(year-(a+1), 1)
+    g = np.where(i < a, 0., np.where(i == a, _column(ebitda_frac)-1,
+                                     np.where(i == a+1, gnext, slope*(i-(a+1))+gnext)))
+    ebitda = np.cumprod(1+g, axis=-1)
+    ebitda = np.concatenate([np.ones(ebitda.shape[:-1]+(1,)), ebitda], axis=-1)
+    return np.where(np.arange(year+1) <= a, 0., ebitda)
+
+
+def interest(debt, rd, interest0):
+    '''interest paid on the debt outstanding at the end of the prior year
+
+    Args:
+        debt: debt, shape (..., year+1)
+        rd: cost of debt
+        interest0: interest in the baseline year
+
+    Returns:
+        interest: shape (..., year+1)
+    '''
+    debt = _array(debt)
+    rd = _column(rd)
+    shape = np.broadcast_shapes(debt.shape, rd.shape)
+    value = np.empty(shape, dtype=np.result_type(debt, rd))
+    value[..., 0] = interest0
+    value[..., 1:] = rd*debt[..., :-1]
+    return value
+
+
+def nol_carryforward(nol0, income_pretax):
+    '''carry forward net operating losses, nol[i] = max(nol[i-1]-income[i], 0)
+
+    The recursion is a clamped cumulative sum, which is solved without a loop
+    by subtracting the running minimum of the unclamped balance.
+
+    Args:
+        nol0: net operating loss in the baseline year
+        income_pretax: pretax income, shape (..., year+1)
+
+    Returns:
+        nol: shape (..., year+1)
+    '''
+    p = _array(income_pretax)
+    nol0 = np.broadcast_to(_array(nol0), p.shape[:-1])
+    s = np.concatenate([nol0[..., None], -p[..., 1:]], axis=-1).cumsum(axis=-1)
+    return s - np.minimum(np.minimum.accumulate(s, axis=-1), 0)
+
+
+def taxes(income_pretax, tax0, nol0, t, te=None, carry=False):
+    '''calculate book taxes, cash taxes and the nol balance
+
+    Args:
+        income_pretax: pretax income, shape (..., year+1)
+        tax0: reported taxes in the baseline year
+        nol0: net operating loss in the baseline year
+        t: marginal tax rate
+        te: effective tax rate for year 1, if None it is calculated from the
+        baseline year
+        carry: if True the first year is a forecast year which has already
+        been calculated, taxes continue from tax0 instead of applying the
+        effective tax rate in the following year
+
+    Returns:
+        tax, tax_cash, income_taxable, nol: arrays of shape (..., year+1)
+    '''
+    p = _array(income_pretax)
+    t = _array(t)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if te is None and carry is False:
+            # important to avoid -'ve taxes with NOL's, also so they don't have
+            # unsustainably low taxes
+            tax_0 = np.maximum(t*p[..., 0], tax0)
+            tax1 = tax_0 + t*(p[..., 1]-p[..., 0])
+            te = tax1/p[..., 1]
+
+        nol = nol_carryforward(nol0, p)
+        pp = np.maximum(p, 0)
+
+        dtype = np.result_type(nol, t)
+        tax = np.empty(nol.shape, dtype=dtype)
+        tax[..., 0] = tax0
+        if carry is True:
+            tax[..., 1:] = _array(tax0)[..., None] + t[..., None] * \
+                (pp[..., 1:] - pp[..., 0:1])
+        else:
+            tax[..., 1] = te*pp[..., 1]
+            # tax[i] = tax[i-1] + t*(pp[i]-pp[i-1]) telescopes from year 1
+            tax[..., 2:] = tax[..., 1:2] + t[..., None] * \
+                (pp[..., 2:] - pp[..., 1:2])
+
+        tax_cash = np.empty(nol.shape, dtype=dtype)
+        tax_cash[..., 0] = tax0
+        tax_cash[..., 1:] = tax[..., 1:] + t[..., None] * \
+            np.minimum(np.diff(nol, axis=-1), 0)
+
+        income_taxable = np.empty(nol.shape, dtype=dtype)
+        # zero the income in the baseline year if NOL>0
+        income_taxable[..., 0] = np.maximum(
+            p[..., 0]*(1-_array(nol0) > 0), 0)
+        income_taxable[..., 1:] = np.maximum(0, p[..., 1:] - nol[..., :-1])
+    return tax, tax_cash, income_taxable, nol
+
+
+def dividend_policy(dividend, shares, fcf):
+    '''total dividends paid under the dividend policy
+
+    Dividends per share are taken from the policy for the years provided,
+    afterwards total dividends grow with fcf but are never cut.
+
+    Args:
+        dividend: list of dividends per share
+        shares: sharecount, shape (..., year+1)
+        fcf: free cash flow, shape (..., year+1)
+
+    Returns:
+        policy: shape (..., year+1)
+    '''
+    fcf = _array(fcf)
+    shares = np.broadcast_to(_array(shares), fcf.shape)
+    n_years = fcf.shape[-1]
+    n_div = len(dividend)
+    k = min(n_div, n_years)
+
+    policy = np.empty(fcf.shape, dtype=np.result_type(fcf, shares))
+    policy[..., :k] = _array(dividend[:k])*shares[..., :k]
+    if n_div < n_years:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = dividend[n_div-1]*shares[..., n_div-1]/fcf[..., n_div-1]
+        tail = np.concatenate([policy[..., n_div-1:n_div],
+                               ratio[..., None]*fcf[..., n_div:]], axis=-1)
+        policy[..., n_div-1:] = np.maximum.accumulate(tail, axis=-1)
+    return policy
+
+
+def cumulative_cash(cash0, fcfe):
+    '''cash as the cumulative fcfe on top of the baseline year cash
+
+    Args:
+        cash0: cash in the baseline year
+        fcfe: free cash flow to equity, shape (..., year+1)
+
+    Returns:
+        cash: shape (..., year+1)
+    '''
+    flows = np.array(_array(fcfe), dtype=np.result_type(_array(fcfe), cash0))
+    flows[..., 0] = cash0
+    missing = np.isnan(flows)
+    # nan's are skipped in the running total, the same as pandas cumsum
+    cash = np.where(missing, 0, flows).cumsum(axis=-1)
+    cash[missing] = np.nan
+    return cash
+
+
+def debt_schedule(debt, target, fcf, cash0, MnA, policy, year_d=1):
+    '''move debt towards the target, limited by the cash available
+
+    If debt is below the target it is increased to the target the following
+    year. If it is above the target, fcf after acquisitions and dividends (and
+    the baseline cash in the first year) is used to pay it down.
+
+    Args:
+        debt: debt, shape (..., year+1)
+        target: debt target, shape (..., year+1)
+        fcf, MnA, policy: yearly fcf, acquisitions and dividend policy
+        cash0: cash in the baseline year
+        year_d: first year in which the debt is adjusted
+
+    Returns:
+        debt: the new debt schedule, shape (..., year+1)
+    '''
+    fcf = _array(fcf)
+    shape = np.broadcast_shapes(np.shape(debt), fcf.shape, np.shape(target))
+    debt = np.array(np.broadcast_to(_array(debt), shape))
+    target = np.broadcast_to(_array(target), shape)
+    available = np.array(np.broadcast_to(fcf-MnA-policy, shape))
+    available[..., 1] = available[..., 1] + cash0
+    for i in range(year_d-1, shape[-1]-1):
+        excess = debt[..., i]-target[..., i+1]
+        # underlevered debt goes to the target, overlevered is paid down
+        dDebt = np.where(excess < 0, -excess, -np.minimum(excess, available[..., i+1]))
+        debt[..., i+1] = debt[..., i]+dDebt
+    return debt
+
+
+def allocate(price, shares0, buybacks, fcfe, cash0=0, dp='constant', ebitda=None, debt=None, multiple=None):
+    '''share count, share price and dividend of a buyback program, for one or
+    many entry prices or price paths at once
+
+    With dp='constant' the shares are bought at the entry price and the share
+    count is the cumulative sum of the shares retired, the same with
+    dp='path' where the price of every year is given. With dp='proportional'
+    the price follows the forward EV/EBITDA multiple of the entry price but
+    never falls, and with dp='multiple' it follows a given path of forward
+    multiples. The price then depends on the shares retired the previous
+    year, so the years are calculated in turn, for all prices at once.
+
+    Args:
+        price: entry share price, shape (...), e.g. a vector of prices, or
+        the price paths for dp='path', shape (..., year+1)
+        shares0: shares in the baseline year
+        buybacks: amount spent on buybacks, shape (..., year+1)
+        fcfe: free cash flow to equity, shape (..., year+1)
+        cash0: cash in the baseline year, part of the EV and distributed in
+        the first year
+        dp: 'constant', 'path', 'proportional' or 'multiple'
+        ebitda, debt: yearly ebitda and debt, required for 'proportional' and
+        'multiple'
+        multiple: forward EV/EBITDA multiple paths for dp='multiple', shape
+        (..., year+1)
+
+    Returns:
+        shares, price, dividend: arrays of shape (..., year+1), the dividend
+        is the fcfe not used for buybacks per share
+    '''
+    if dp not in ['constant', 'path', 'proportional', 'multiple']:
+        raise ValueError("dp must be 'constant', 'path', 'proportional' or 'multiple', not {!r}".format(dp))
+    price = _array(price)
+    if dp != 'path':
+        price = price[..., None]
+    buybacks = _array(buybacks)
+    fcfe = _array(fcfe)
+    if dp == 'proportional':
+        # forward multiple of the entry price, no need to include later cash
+        # since cash is used fully for buybacks or dividends
+        multiple = (price*shares0 + debt[0]-cash0)/ebitda[1]
+    shape = np.broadcast_shapes(price.shape, buybacks.shape, fcfe.shape, np.shape(multiple))
+    buybacks = np.broadcast_to(buybacks, shape)
+    shares = np.empty(shape)
+    shares[..., 0] = shares0
+    if dp in ['constant', 'path']:
+        prices = np.array(np.broadcast_to(price, shape))
+        shares[..., 1:] = shares0 - np.cumsum(buybacks[..., 1:]/prices[..., :-1], axis=-1)
+    else:
+        multiple = np.broadcast_to(_array(multiple), shape)
+        prices = np.empty(shape)
+        prices[..., 0] = price[..., 0]
+        for i in range(shape[-1]-2):
+            shares[..., i+1] = shares[..., i] - buybacks[..., i+1]/prices[..., i]
+            prices[..., i+1] = (multiple[..., i+1]*ebitda[i+2] - debt[i+1])/shares[..., i+1]
+            if dp == 'proportional':
+                prices[..., i+1] = np.maximum(prices[..., i+1], prices[..., i])
+        prices[..., -1] = prices[..., -2]
+        shares[..., -1] = shares[..., -2] - buybacks[..., -1]/prices[..., -1]
+
+    flows = np.array(np.broadcast_to(fcfe-buybacks, shape))
+    flows[..., 1] = flows[..., 1] + cash0
+    return shares, prices, flows/shares
+
+
+def gbm(x0, paths, year, sigma, mu=0., rng=None):
+    '''paths of a geometric brownian motion, e.g. share prices
+
+    Args:
+        x0: value in the baseline year
+        paths: number of paths
+        year: final forecast year
+        sigma: volatility of one period
+        mu: drift of one period
+        rng: numpy random generator or seed
+
+    Returns:
+        x: array of shape (paths, year+1)
+    '''
+    rng = np.random.default_rng(rng)
+    steps = (mu - sigma**2/2) + sigma*rng.standard_normal((paths, year))
+    x = np.zeros((paths, year+1))
+    np.cumsum(steps, axis=-1, out=x[:, 1:])
+    return x0*np.exp(x)
+
+
+def mean_reverting(x0, paths, year, sigma, theta, rng=None):
+    '''paths of a value which reverts to x0, e.g. an EV/EBITDA multiple. The
+    log of the value is an AR(1) process around the log of x0.
+
+    Args:
+        x0: value in the baseline year and the long run value
+        paths: number of paths
+        year: final forecast year
+        sigma: volatility of one period
+        theta: fraction of the log deviation from x0 which reverts each
+        period
+        rng: numpy random generator or seed
+
+    Returns:
+        x: array of shape (paths, year+1)
+    '''
+    rng = np.random.default_rng(rng)
+    shocks = sigma*rng.standard_normal((paths, year))
+    x = np.zeros((paths, year+1))
+    for i in range(year):
+        x[:, i+1] = (1-theta)*x[:, i] + shocks[:, i]
+    return x0*np.exp(x)
+
+
+def free_cash_flows(ebitda, sbc, capex, dwc, debt, MnA, da, interest0, tax0,
+                    nol0, rd, t, te=None, carry=False):
+    '''calculate interest, taxes and free cash flows from an ebitda forecast
+
+    All yearly inputs have shape (..., year+1), the rates may be scalars or
+    arrays of shape (...), one for each scenario.
+
+    Args:
+        ebitda, sbc, capex, dwc, debt, MnA, da: yearly forecasts
+        interest0: interest in the baseline year
+        tax0: reported taxes in the baseline year
+        nol0: net operating loss in the baseline year
+        rd: cost of debt
+        t: marginal tax rate
+        te: effective tax rate for year 1
+        carry: if True the arrays start at a forecast year which has already
+        been calculated and the taxes continue from it, see taxes()
+
+    Returns:
+        cols: dictionary of the calculated yearly columns, in the order they
+        appear in the fin dataframe
+    '''
+    ebitda = _array(ebitda)
+    debt = _array(debt)
+    tc = _column(t)
+
+    i = interest(debt, rd, interest0)
+    income_pretax = ebitda - sbc - da - i
+    dDebt = np.zeros(debt.shape, dtype=debt.dtype)
+    dDebt[..., 1:] = np.diff(debt, axis=-1)
+    tax, tax_cash, income_taxable, nol = taxes(income_pretax, tax0, nol0, t, te, carry)
+
+    fcf = ebitda - sbc - tax_cash - capex - dwc - i
+    fcfe = ebitda - sbc - tax_cash - capex - dwc + dDebt - i - MnA
+    fcff = ebitda - sbc - tax_cash - capex - dwc - i*tc - MnA
+
+    shape = income_pretax.shape
+    return {
+        'interest': np.broadcast_to(i, shape),
+        'da': np.broadcast_to(da, shape),
+        'income_pretax': income_pretax,
+        'dDebt': np.broadcast_to(dDebt, shape),
+        'tax_cash': tax_cash,
+        'tax': tax,
+        'income_taxable': income_taxable,
+        'nol': nol,
+        'fcf': fcf,
+        'fcfe': fcfe,
+        'fcff': fcff,
+    }
+
+
+def fcf_from_ebitda(ebitda, sbc, capex, dwc, debt, MnA, shares, buybacks, da,
+                    interest0, tax0, nol0, cash0, dividend, rd, t, te=None):
+    '''calculate taxes, free cash flows and distributions from an ebitda
+    forecast
+
+    All yearly inputs have shape (..., year+1), the rates may be scalars or
+    arrays of shape (...), one for each scenario.
+
+    Args:
+        ebitda, sbc, capex, dwc, debt, MnA, shares, buybacks, da: yearly
+        forecasts
+        interest0: interest in the baseline year
+        tax0: reported taxes in the baseline year
+        nol0: net operating loss in the baseline year
+        cash0: cash in the baseline year
+        dividend: list of dividends per share, the dividend policy
+        rd: cost of debt
+        t: marginal tax rate
+        te: effective tax rate for year 1
+
+    Returns:
+        cols: dictionary of the calculated yearly columns, in the order they
+        appear in the fin dataframe
+    '''
+    cols = free_cash_flows(ebitda, sbc, capex, dwc, debt, MnA, da, interest0,
+                           tax0, nol0, rd, t, te)
+    cols['dividend_policy'] = dividend_policy(dividend, shares, cols['fcf'])
+    cols['dividend'] = (cols['fcfe']-buybacks)/shares
+    cols['cash'] = cumulative_cash(cash0, cols['fcfe'])
+    return cols
+
+
+def pv(cfs, r, g, cft=None):
+    '''calculate the present value of future cash flows in every year.
+
+    Flows from the current year are not included, only future years. The last
+    value is the terminal value. The flows are discounted to year 0 with the
+    cumulative discount factors and summed from the back, so the cost is
+    linear in the number of years.
+
+    Args:
+        cfs: cash flows, shape (..., year+1)
+        r: discount rate, a scalar or an array which broadcasts against cfs,
+        use shape (..., 1) for one rate per row or (..., year+1) for a rate
+        curve per row
+        g: terminal growth, shape (...)
+        cft: terminal cash flow, shape (...), if None it is grown from the
+        last cash flow
+
+    Returns:
+        value: shape (..., year+1)
+    '''
+    cfs = _array(cfs)
+    shape = np.broadcast_shapes(cfs.shape, np.shape(r))
+    cfs = np.broadcast_to(cfs, shape)
+    r = np.broadcast_to(_array(r), shape)
+    g = _array(g)
+
+    if cft is None:
+        tv = cfs[..., -1]*(1+g)/(r[..., -1]-g)
+    else:
+        tv = cft/(r[..., -1]-g)
+
+    # the rate in year i discounts the flows of year i+1 back to year i
+    discount = np.ones(shape, dtype=np.result_type(cfs, r))
+    discount[..., 1:] = np.cumprod(1/(1+r[..., :-1]), axis=-1)
+    flows = cfs*discount
+    tail = np.zeros(shape, dtype=discount.dtype)
+    tail[..., :-1] = np.flip(np.cumsum(np.flip(flows[..., 1:], axis=-1), axis=-1), axis=-1)
+    return (tail + (tv*discount[..., -1])[..., None])/discount
+
+
+def value(fcf, fcfe, fcff, dDebt, debt, dividend, shares, noa, cash, cashBS,
+          cash0, shares0, re, rd, t, gt):
+    '''calculate the firm, equity and DDM values
+
+    All yearly inputs have shape (..., year+1), the rates may be scalars or
+    arrays of shape (...), one for each scenario.
+
+    Args:
+        fcf, fcfe, fcff, dDebt, debt, dividend, shares, noa, cash, cashBS:
+        yearly columns of the fin dataframe
+        cash0: cash in the baseline year which is distributed to the owners
+        shares0: current sharecount
+        re: cost of equity
+        rd: cost of debt
+        t: marginal tax rate
+        gt: terminal growth
+
+    Returns:
+        cols: dictionary of the yearly value columns and the terminal FCFE
+        'fcfet'
+    '''
+    fcf = _array(fcf)
+    debt = _array(debt)
+    shares = _array(shares)
+    cashBS = _array(cashBS)
+    rd = _array(rd)
+    gt = _array(gt)
+
+    # terminal FCFE where there is terminal growth and changes in debt the
+    # final year before terminal
+    fcfet = (fcf[..., -1]-_array(dDebt)[..., -1]*rd +
+             debt[..., -1]*gt)*(1+gt)
+
+    equity = pv(fcfe, _column(re), gt, cft=fcfet)
+    EV = debt + equity
+    wacc = (debt*_column(rd)*(1-_column(t)) + equity*_column(re))/EV
+    firm = pv(fcff, wacc, gt)
+    DDM = pv(dividend, _column(re), gt, cft=fcfet/shares[..., -1])
+
+    # adjustments for cash and non-operating assets
+    value_per_share = (equity+noa)/shares0
+    value_per_share[..., 0] = value_per_share[..., 0] + \
+        _array(cash)[..., 0]/shares0
+    value_per_share_DDM = DDM + noa/shares
+    value_per_share_DDM[..., 0] = value_per_share_DDM[..., 0] + \
+        cash0/shares[..., 0]
+    value_per_share_DDM[..., -1] = value_per_share_DDM[..., -1] + \
+        cashBS[..., -1]/shares[..., -1]
+    return {
+        'fcfet': fcfet,
+        'equity': equity,
+        'EV': EV,
+        'wacc': wacc,
+        'firm': firm,
+        'DDM': DDM,
+        'value_per_share': value_per_share,
+        'value_per_share_DDM': value_per_share_DDM,
+    }
+
+
+def root(f, lo, hi, x0=None, step=0.05, tol=1e-6, max_iter=100):
+    '''find x so that f(x)=0 for every element, with a bracketed solver
+
+    Uses the Illinois variant of regula falsi on all elements at once, f is
+    called with an array of x and returns an array, the solution has the
+    broadcast shape of the limits and f. If a
+    warm start x0 is provided the bracket starts at x0+/-step and is widened
+    until it contains the root, limited to [lo, hi].
+
+    Args:
+        f: function of an array of x
+        lo, hi: limits of the bracket, scalars or arrays
+        x0: warm start, scalar or array
+        step: initial half width of the bracket around x0
+        tol: convergence tolerance on |f(x)|
+        max_iter: maximum number of function evaluations for the solver
+
+    Returns:
+        x, fx, converged, iterations
+    '''
+    lo = np.asarray(lo, dtype=float)
+    hi = np.asarray(hi, dtype=float)
+    if x0 is None:
+        a, b = lo, hi
+    else:
+        x0 = np.clip(np.asarray(x0, dtype=float), lo, hi)
+        a, b = np.maximum(x0-step, lo), np.minimum(x0+step, hi)
+    fa, fb = np.asarray(f(a), dtype=float), np.asarray(f(b), dtype=float)
+    shape = np.broadcast_shapes(a.shape, b.shape, fa.shape, fb.shape)
+    a, b = np.broadcast_to(a, shape), np.broadcast_to(b, shape)
+    fa, fb = np.broadcast_to(fa, shape), np.broadcast_to(fb, shape)
+
+    # widen the bracket until the root is inside of it or the limits are hit
+    width = np.full(shape, float(step))
+    while True:
+        open_ = (np.sign(fa) == np.sign(fb)) & ((a > lo) | (b < hi))
+        if not np.any(open_):
+            break
+        width = np.where(open_, 2*width, width)
+        a = np.where(open_, np.maximum(a-width, lo), a)
+        b = np.where(open_, np.minimum(b+width, hi), b)
+        fa, fb = f(a), f(b)
+
+    bracketed = np.sign(fa) != np.sign(fb)
+    x = np.where(np.abs(fa) < np.abs(fb), a, b)
+    fx = np.where(np.abs(fa) < np.abs(fb), fa, fb)
+    converged = bracketed & (np.abs(fx) <= tol)
+    side = np.zeros(shape)
+    iterations = 0
+    while iterations < max_iter and not np.all(converged | ~bracketed):
+        iterations += 1
+        active = bracketed & ~converged
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = (a*fb-b*fa)/(fb-fa)
+        c = np.where(np.isfinite(c), c, (a+b)/2)
+        fc = f(np.where(active, c, x))
+        x = np.where(active, c, x)
+        fx = np.where(active, fc, fx)
+        converged = converged | (active & (np.abs(fc) <= tol))
+
+        # keep the root bracketed, halve the function value of an end point
+        # which is retained twice in a row (Illinois)
+        left = active & (np.sign(fc) == np.sign(fa))
+        right = active & ~left
+        fb = np.where(left & (side == 1), fb/2, fb)
+        fa = np.where(right & (side == -1), fa/2, fa)
+        a = np.where(left, c, a)
+        fa = np.where(left, fc, fa)
+        b = np.where(right, c, b)
+        fb = np.where(right, fc, fb)
+        side = np.where(left, 1, np.where(right, -1, side))
+
+    x = np.where(bracketed, x, np.nan)
+    return x, fx, converged, iterations
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# columns which are only used while calculating and are not kept
+SCRATCH = ('debt_Target',)
+
+# column layouts shared by the containers with the same columns
+_layouts = {}
+
+
+class Financials:
+    '''compact container of the yearly financials of a company, the
+    alternative to the fin dataframe for keeping a large universe in memory
+
+    The columns are the rows of one 2-D float64 array, so each column is a
+    contiguous array which the engine can use directly. Non-numeric values
+    are stored as nan. The dataframe is only built by to_frame().
+
+    Args:
+        values: array of shape (columns, years)
+        columns: names of the columns
+        dates: date of each year
+
+    Attributes:
+        columns (tuple): names of the columns, shared between containers
+        dates (array): datetime64 date of each year
+        values (array): float64 array of shape (columns, years)
+    '''
+    __slots__ = ('columns', 'dates', 'values')
+
+    def __init__(self, values, columns, dates):
+        columns = tuple(columns)
+        self.columns = _layouts.setdefault(columns, columns)
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.values = np.ascontiguousarray(values, dtype=float)
+
+    @classmethod
+    def from_frame(cls, fin):
+        '''build the container from a fin dataframe, without the SCRATCH
+        columns
+
+        Args:
+            fin: the fin dataframe of a company
+
+        Returns:
+            financials: Financials
+        '''
+        columns = [key for key in fin.columns if key not in SCRATCH]
+        values = np.empty((len(columns), len(fin)))
+        for i, key in enumerate(columns):
+            values[i] = pd.to_numeric(fin[key], errors='coerce').to_numpy(dtype=float)
+        return cls(values, columns, fin.index.to_numpy())
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def __getitem__(self, key):
+        '''the values of a column, a view of the array'''
+        return self.values[self.columns.index(key)]
+
+    @property
+    def nbytes(self):
+        '''bytes of the arrays'''
+        return self.values.nbytes + self.dates.nbytes
+
+    def to_frame(self):
+        '''the fin dataframe
+
+        Returns:
+            fin: dataframe indexed by date with a float column for each column
+        '''
+        return pd.DataFrame(self.values.T, index=pd.DatetimeIndex(self.dates, name='date'),
+                            columns=list(self.columns))
@@ -0,0 +1,297 @@
+import datetime
+import glob
+import importlib.util
+import logging
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# the excel template of the report, in the project folder
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'company_template.xlsx')
+
+# columns of the summary table returned by display_fin()
+TABLE = ['revenue', 'ebitda', 'sbc', 'da', 'interest', 'income_pretax', 'nol', 'income_taxable', 'tax_cash', 'tax',
+         'capex', 'MnA', 'dDebt', 'dwc', 'fcf', 'fcfe', 'fcff', 'buybacks', 'dividend', 'cash', 'cashBS', 'noa',
+         'equity', 'debt', 'EV', 'wacc', 'firm', 'shares', 'price', 'value_per_share', 'value_per_share_DDM']
+
+# year 0 results in the summary sheet of a workbook with several tickers
+SUMMARY = ['ticker', 'date', 'rd', 're', 'gt', 't', 'shares', 'price', 'equity', 'firm', 'fcfet',
+           'value_per_share', 'value_per_share_DDM']
+
+# yearly columns of the columnar dataset, a fixed schema so that the files of
+# every batch and run can be read as one table
+COLUMNS = ['revenue', 'e', 'ebitda', 'capex', 'dwc', 'sbc', 'tax', 'da', 'debt', 'interest', 'cash', 'nol', 'noa',
+           'shares', 'price', 'MnA', 'buybacks', 'cashBS', 'income_pretax', 'dDebt', 'tax_cash', 'income_taxable',
+           'fcf', 'fcfe', 'fcff', 'dividend_policy', 'dividend', 'debt_Target', 'equity', 'EV', 'wacc', 'firm', 'DDM',
+           'value_per_share', 'value_per_share_DDM']
+
+# scalar inputs and results repeated on every row of the dataset
+SCALARS = ['re', 'rd', 'gt', 'roict', 't', 'fcfet', 'vpsbb']
+
+logger = logging.getLogger(__name__)
+
+_templates = {}
+
+
+def template(path=None):
+    '''the template workbook, parsed once for each file and reused until the
+    file is modified
+
+    The workbook is shared, save_report() restores it after each report.
+
+    Args:
+        path: template file, default is company_template.xlsx
+
+    Returns:
+        wb: openpyxl workbook
+    '''
+    from openpyxl import load_workbook
+
+    path = os.path.normpath(TEMPLATE if path is None else path)
+    mtime = os.path.getmtime(path)
+    if path not in _templates or _templates[path][0] != mtime:
+        _templates[path] = (mtime, load_workbook(filename=path))
+    return _templates[path][1]
+
+
+def raw_rows(fin):
+    '''rows of the transposed fin dataframe, the layout of the 'raw data'
+    sheet: a row of dates, an empty row and a row for each column
+
+    Args:
+        fin: the fin dataframe
+
+    Returns:
+        rows: generator of lists
+    '''
+    yield ['date'] + list(fin.index)
+    yield [None]
+    for key in fin.columns:
+        yield [key] + fin[key].tolist()
+
+
+def _fin(c):
+    '''the fin dataframe of a company, built from its compact container
+    without keeping it, see company.compact()'''
+    if c.compacted is not None:
+        return c.compacted.to_frame()
+    return c.fin
+
+
+def save_report(c, filename=None, path=None):
+    '''write the report of a company from the template
+
+    Args:
+        c: company
+        filename: name of the excel file, default is '<ticker>.xlsx'
+        path: template file, default is company_template.xlsx
+    '''
+    wb = template(path)
+    sheets = list(wb.sheetnames)
+    raw = wb['raw data']
+    index = wb.index(raw)
+    try:
+        for row in raw_rows(c.fin):
+            raw.append(row)
+
+        ws = wb['report']
+        ws['B2'] = c.ticker
+        ws['B3'] = c.now
+        ws['B4'] = 'David May'
+
+        ws['B6'] = c.rd
+        ws['B7'] = c.re
+        ws['B8'] = c.gt
+        ws['B9'] = c.t
+        ws['A10'] = 'Terminal ROIC'
+        ws['B10'] = c.roict
+
+        ws['B11'] = c.fin['cash'].iloc[-1]
+        ws['B12'] = c.fcfet
+        ws['B13'] = c.fin['equity'].iloc[-1]
+        ws['B15'] = c.shares
+        ws['B17'] = c.fin['value_per_share_DDM'].iloc[0]
+
+        # inputs of the model which aren't in the raw data, so that the
+        # report reads back as the same model, see universe.read_workbook()
+        dividend = list(c.dividend)
+        for row, label, value in [(54, 'Period', c.period), (55, 'Share price', c.price),
+                                  (56, 'Effective Tax', c.te),
+                                  (57, 'Dividend policy', dividend[0] if len(dividend) == 1
+                                   else ';'.join(str(v) for v in dividend))]:
+            ws['A{}'.format(row)] = label
+            ws['B{}'.format(row)] = value
+
+        # sensitivity tables, one sheet each
+        for name, sensitivity in c.sensitivities.items():
+            ws = wb.create_sheet(name)
+            ws.append([sensitivity.index.name+' \\ '+sensitivity.columns.name] + list(sensitivity.columns))
+            for x, row in sensitivity.iterrows():
+                ws.append([x] + list(row))
+
+        wb.save(c.ticker+'.xlsx' if filename is None else filename)
+    finally:
+        # restore the shared template
+        for name in wb.sheetnames:
+            if name not in sheets:
+                del wb[name]
+        del wb['raw data']
+        wb.create_sheet('raw data', index)
+
+
+def save_workbook(companies, filename, style=False):
+    '''write the results of many companies to one workbook, a summary sheet
+    followed by the raw data of each ticker
+
+    The workbook is written in write-only mode, without the template.
+
+    Args:
+        companies: list of companies, with value() calculated
+        filename: name of the excel file
+        style: apply number formats to the cells
+    '''
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet('summary')
+    summary.append(SUMMARY)
+    for c in companies:
+        fin = _fin(c)
+        values = {'ticker': c.ticker, 'date': fin.index[0], 'rd': c.rd, 're': c.re, 'gt': c.gt, 't': c.t,
+                  'shares': c.shares, 'price': c.price, 'fcfet': getattr(c, 'fcfet', None)}
+        for key in ['equity', 'firm', 'value_per_share', 'value_per_share_DDM']:
+            values[key] = fin[key].iloc[0] if key in fin else None
+        summary.append([values[key] for key in SUMMARY])
+
+    for c in companies:
+        ws = wb.create_sheet(str(c.ticker)[:31])
+        for i, row in enumerate(raw_rows(_fin(c))):
+            if style is True and i != 1:
+                cells = [WriteOnlyCell(ws, value=v) for v in row]
+                for cell in cells[1:]:
+                    cell.number_format = 'mm-dd-yy' if i == 0 else '#,##0.0'
+                row = cells
+            ws.append(row)
+    wb.save(filename)
+
+
+def to_records(c, run_date):
+    '''the fin dataframe of a company in the layout of the columnar dataset
+
+    Args:
+        c: company
+        run_date: date of the run, string 'YYYY-MM-DD'
+
+    Returns:
+        frame: a row for each year with the date, the year, the COLUMNS,
+        the SCALARS, the run_date and the ticker
+    '''
+    fin = _fin(c)
+    frame = pd.DataFrame({'date': pd.to_datetime(fin.index), 'year': np.arange(len(fin))})
+    for key in COLUMNS:
+        frame[key] = pd.to_numeric(fin[key], errors='coerce').to_numpy(dtype=float) if key in fin else np.nan
+    for key in SCALARS:
+        value = getattr(c, key, None)
+        frame[key] = np.nan if value is None else float(value)
+    frame['run_date'] = run_date
+    frame['ticker'] = str(c.ticker)
+    return frame
+
+
+def _parquet():
+    '''True if pyarrow is installed, it is an optional dependency'''
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def write_dataset(companies, root, run_date=None, fmt='parquet', batch=500):
+    '''append the fin dataframes of many companies to a columnar dataset,
+    partitioned by run date and ticker
+
+    The files are written in the hive layout
+    root/run_date=YYYY-MM-DD/ticker=XYZ/<id>.parquet, the companies are
+    collected in batches which are written at once. Parquet requires
+    pyarrow, without it the dataset is written as csv files.
+
+    Args:
+        companies: iterable of companies, with value() calculated
+        root: folder of the dataset
+        run_date: date of the run, default is today
+        fmt: 'parquet' or 'csv'
+        batch: number of companies written at once
+
+    Returns:
+        fmt: the format which was written
+    '''
+    if run_date is None:
+        run_date = datetime.date.today()
+    run_date = str(run_date)
+    if fmt == 'parquet' and not _parquet():
+        logger.warning('pyarrow is not installed, the dataset is written as csv')
+        fmt = 'csv'
+
+    frames = []
+    for c in companies:
+        frames.append(to_records(c, run_date))
+        if len(frames) == batch:
+            _write(pd.concat(frames, ignore_index=True), root, fmt)
+            frames = []
+    if frames:
+        _write(pd.concat(frames, ignore_index=True), root, fmt)
+    return fmt
+
+
+def _write(frame, root, fmt):
+    '''write one batch of records to the dataset'''
+    if fmt == 'parquet':
+        frame.to_parquet(root, engine='pyarrow', partition_cols=['run_date', 'ticker'], index=False)
+        return
+    part = 'part-{}.csv'.format(uuid.uuid4().hex)
+    for (run_date, ticker), records in frame.groupby(['run_date', 'ticker'], sort=False):
+        folder = os.path.join(root, 'run_date='+run_date, 'ticker='+ticker)
+        os.makedirs(folder, exist_ok=True)
+        records.drop(columns=['run_date', 'ticker']).to_csv(os.path.join(folder, part), index=False)
+
+
+def read_dataset(root, run_date=None, tickers=None):
+    '''read the columnar dataset written by write_dataset() as one table
+
+    Args:
+        root: folder of the dataset
+        run_date: only read this run, string or date
+        tickers: only read these tickers
+
+    Returns:
+        frame: dataframe of the records
+    '''
+    if glob.glob(os.path.join(root, '*', '*', '*.parquet')):
+        filters = []
+        if run_date is not None:
+            filters.append(('run_date', '=', str(run_date)))
+        if tickers is not None:
+            filters.append(('ticker', 'in', list(tickers)))
+        frame = pd.read_parquet(root, engine='pyarrow', filters=filters or None)
+        for key in ['run_date', 'ticker']:
+            frame[key] = frame[key].astype(str)
+        return frame
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(root, 'run_date=*', 'ticker=*', '*.csv'))):
+        folder, name = os.path.split(path)
+        folder, ticker = os.path.split(folder)
+        date = os.path.basename(folder)
+        ticker = ticker[len('ticker='):]
+        date = date[len('run_date='):]
+        if run_date is not None and date != str(run_date):
+            continue
+        if tickers is not None and ticker not in tickers:
+            continue
+        records = pd.read_csv(path, parse_dates=['date'])
+        records['run_date'] = date
+        records['ticker'] = ticker
+        frames.append(records)
+    if not frames:
+        return pd.DataFrame(columns=['date', 'year'] + COLUMNS + SCALARS + ['run_date', 'ticker'])
+    return pd.concat(frames, ignore_index=True)
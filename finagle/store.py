@@ -0,0 +1,182 @@
+import datetime
+import json
+import logging
+import struct
+
+import numpy as np
+import pandas as pd
+
+import finagle
+from finagle.financials import Financials
+
+# the file starts with MAGIC and the length of the json header, the float64
+# block of the fin columns starts at the next multiple of ALIGN
+MAGIC = b'FINAGLE\x01'
+ALIGN = 64
+
+# attributes of a company which aren't part of the scalar state
+SKIP = ('log', 'logfile', '_fin', 'compacted', '_shared')
+
+
+def _encode(value):
+    '''json encoding of an attribute of a company, numpy values, dates and
+    dataframes are tagged so that _decode() can restore them'''
+    if isinstance(value, dict):
+        return {'__dict__': [[k, _encode(v)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return {'__array__': value.tolist(), 'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return {'__scalar__': value.item(), 'dtype': value.dtype.str}
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, pd.DataFrame):
+        return {'__frame__': _encode(value.to_dict(orient='split')),
+                'names': [value.index.name, value.columns.name]}
+    return value
+
+
+def _decode(value):
+    '''inverse of _encode()'''
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if '__dict__' in value:
+        return {k: _decode(v) for k, v in value['__dict__']}
+    if '__array__' in value:
+        return np.array(value['__array__'], dtype=value['dtype'])
+    if '__scalar__' in value:
+        return np.dtype(value['dtype']).type(value['__scalar__'])
+    if '__datetime__' in value:
+        return pd.Timestamp(value['__datetime__'])
+    if '__date__' in value:
+        return datetime.date.fromisoformat(value['__date__'])
+    if '__frame__' in value:
+        split = _decode(value['__frame__'])
+        frame = pd.DataFrame(split['data'], index=split['index'], columns=split['columns'])
+        frame.index.name, frame.columns.name = value['names']
+        return frame
+    return value
+
+
+def save(c, path):
+    '''write a calculated company to a binary file, see company.save()
+
+    The numeric columns of fin are one float64 block, the other columns and
+    the scalar state of the company are in the json header.
+
+    Args:
+        c: company
+        path: name of the file
+    '''
+    if c.compacted is not None:
+        fin = c.compacted
+        columns = list(fin.columns)
+        dtypes = ['<f8']*len(columns)
+        values = fin.values
+        dates = fin.dates
+        objects = {}
+    else:
+        fin = c.fin
+        columns = list(fin.columns)
+        dtypes = []
+        values = np.full((len(columns), len(fin)), np.nan)
+        objects = {}
+        for i, key in enumerate(columns):
+            if fin[key].dtype.kind in 'fiub':
+                dtypes.append(fin[key].dtype.str)
+                values[i] = fin[key].to_numpy(dtype=float)
+            else:
+                dtypes.append(None)
+                objects[key] = _encode(fin[key].tolist())
+        dates = fin.index.to_numpy()
+
+    header = {
+        'version': finagle.__version__,
+        'shape': list(values.shape),
+        'columns': columns,
+        'dtypes': dtypes,
+        'objects': objects,
+        'dates': np.datetime_as_string(np.asarray(dates, dtype='datetime64[ns]')).tolist(),
+        'state': _encode({k: v for k, v in vars(c).items() if k not in SKIP}),
+    }
+    text = json.dumps(header).encode()
+    offset = -(-(len(MAGIC)+8+len(text)) // ALIGN) * ALIGN
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', offset))
+        f.write(text)
+        f.write(b' '*(offset-len(MAGIC)-8-len(text)))
+        f.write(np.ascontiguousarray(values, dtype='<f8').tobytes())
+
+
+def read_header(path):
+    '''the json header of a file written by save()
+
+    Returns:
+        header, offset: the header dict and the position of the float64 block
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a finagle company file'.format(path))
+        offset, = struct.unpack('<Q', f.read(8))
+        text = f.read(offset-len(MAGIC)-8)
+    return json.loads(text), offset
+
+
+def load(path, cls, mmap=True, compact=False):
+    '''read a company written by save(), see company.load()
+
+    Args:
+        path: name of the file
+        cls: the company class
+        mmap: memory map the float64 block instead of reading it. The map is
+        copy-on-write, changes to the company are never written to the file.
+        compact: keep the numeric columns as a Financials container instead
+        of building the fin dataframe, see company.compact()
+
+    Returns:
+        c: company
+    '''
+    header, offset = read_header(path)
+    shape = tuple(header['shape'])
+    if mmap is True and shape[0]*shape[1] > 0:
+        values = np.memmap(path, dtype='<f8', mode='c', offset=offset, shape=shape)
+    else:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            values = np.fromfile(f, dtype='<f8', count=shape[0]*shape[1]).reshape(shape)
+    dates = pd.DatetimeIndex(header['dates'], name='date')
+
+    c = cls.__new__(cls)
+    state = _decode(header['state'])
+    for key, value in state.items():
+        setattr(c, key, value)
+    c.log = logging.getLogger('finagle.company').getChild(str(c.ticker))
+    c.logfile = None
+    c._fin = None
+    c.compacted = None
+    c._shared = set()
+
+    columns = header['columns']
+    dtypes = header['dtypes']
+    if compact is True:
+        numeric = [i for i, dtype in enumerate(dtypes) if dtype is not None]
+        c.compacted = Financials(values[numeric] if len(numeric) < len(columns) else values,
+                                 [columns[i] for i in numeric], dates)
+        return c
+
+    # the frame is a view of the block, the columns which aren't float64
+    # replace their rows in place so the order of the columns is kept
+    fin = pd.DataFrame(np.asarray(values).T, index=dates, columns=columns, copy=False)
+    for key, dtype in zip(columns, dtypes):
+        if dtype is None:
+            fin[key] = _decode(header['objects'][key])
+        elif dtype != '<f8':
+            fin[key] = fin[key].astype(dtype)
+    c._fin = fin
+    return c
@@ -0,0 +1,569 @@
+import collections
+import concurrent.futures
+import copy
+import csv
+import datetime
+import glob
+import inspect
+import itertools
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from finagle.company import PERIODS, company, silent
+
+logger = logging.getLogger(__name__)
+
+# methods which can be called from a spec, in addition to value()
+STEPS = ('forecast_', 'load_financials', 'fcf_', 'noa_')
+
+# year 0 columns of the fin dataframe reported for each company
+RESULTS = ['value_per_share', 'value_per_share_DDM', 'equity', 'firm']
+
+# fields of a flat record which go in the financials dict, the other fields
+# are arguments of the company constructor
+FINANCIALS = ('date', 'revenue', 'e', 'ebitda', 'capex', 'dwc', 'sbc', 'tax', 'da', 'debt',
+              'interest', 'cash', 'nol', 'noa', 'MnA')
+ARGS = tuple(name for name in inspect.signature(company).parameters if name not in ('financials', 'ticker'))
+
+# labels in the first column of the report sheet of the company template and
+# the constructor argument in the second column
+LABELS = {'Ticker Symbol': 'ticker', 'Cost of Debt': 'rd', 'Cost of Equity': 're', 'Terminal growth': 'gt',
+          'Marginal Tax': 't', 'Shares': 'shares', 'Share price': 'price', 'Terminal ROIC': 'roict',
+          'Period': 'period', 'Effective Tax': 'te', 'Dividend policy': 'dividend'}
+
+# financials of which only the baseline year is used
+BASELINE = ('cash', 'nol', 'noa')
+
+# number of specs sent to a worker at once when the number of specs isn't
+# known in advance
+CHUNKSIZE = 50
+
+
+def _cell(text):
+    '''value of a csv cell: empty for a missing value, json for numbers and
+    lists, a list of numbers separated by ';', or the text itself'''
+    text = text.strip()
+    if text == '':
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    if ';' in text:
+        return [None if v.strip() == '' else float(v) for v in text.split(';')]
+    return text
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def to_spec(record, steps=None):
+    '''the spec of a record of an input file, checking its fields
+
+    A record is either a spec (with a 'financials' dict) or a flat record
+    with the ticker, the FINANCIALS fields, the arguments of the company
+    constructor and optionally the steps.
+
+    Args:
+        record: dict
+        steps: the steps of records which don't have their own
+
+    Returns:
+        spec: dict, see run_spec()
+    '''
+    if 'financials' in record:
+        unknown = set(record) - {'ticker', 'args', 'financials', 'steps'}
+        spec = {key: record[key] for key in ['ticker', 'args', 'financials', 'steps'] if key in record}
+        spec['args'] = dict(spec.get('args') or {})
+    else:
+        unknown = set(record) - set(FINANCIALS) - set(ARGS) - {'ticker', 'steps'}
+        spec = {'ticker': record.get('ticker'),
+                'args': {key: record[key] for key in ARGS if record.get(key) is not None},
+                'financials': {key: record[key] for key in FINANCIALS if record.get(key) is not None}}
+        if record.get('steps') is not None:
+            spec['steps'] = record['steps']
+    if unknown:
+        raise ValueError('unknown fields {}'.format(', '.join(sorted(unknown))))
+    if steps is not None and 'steps' not in spec:
+        spec['steps'] = copy.deepcopy(steps)
+
+    if not spec.get('ticker'):
+        raise ValueError('no ticker')
+    financials = spec['financials']
+    if not isinstance(financials, dict):
+        raise ValueError('financials is not a dict')
+    try:
+        datetime.datetime.strptime(str(financials.get('date')), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("date {!r} is not 'YYYY-MM-DD'".format(financials.get('date')))
+    for key, value in financials.items():
+        if key == 'date':
+            continue
+        values = value if isinstance(value, list) else [value]
+        if not all(v is None or _number(v) for v in values):
+            raise ValueError('{} is not a number or a list of numbers'.format(key))
+    for key, value in spec['args'].items():
+        if key not in ARGS:
+            raise ValueError('{} is not an argument of company'.format(key))
+        if key == 'year' and not (isinstance(value, int) and value > 0):
+            raise ValueError('year is not a positive integer')
+        if key == 'period' and value not in PERIODS:
+            raise ValueError('period must be one of {}'.format(', '.join(PERIODS)))
+        if key in ['re', 'rd', 't', 'te', 'shares', 'price', 'gt', 'roict'] and not (value is None or _number(value)):
+            raise ValueError('{} is not a number'.format(key))
+    return spec
+
+
+def _records(path):
+    '''the records of a file with their line number'''
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            # the header is line 1
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, {key: _cell(value or '') for key, value in row.items() if key}
+        elif path.endswith('.jsonl'):
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+        else:
+            for i, record in enumerate(json.load(f)):
+                yield i, record
+
+
+def iter_specs(path, steps=None, errors='raise'):
+    '''stream the specs of a universe from a file, one record at a time
+
+    The .csv and .jsonl files are read line by line, so the memory used
+    doesn't grow with the size of the universe. A .json file is a list which
+    is read at once. The records are converted and checked by to_spec().
+    In a csv file lists are json ('[881, 900]') or numbers separated by ';'.
+
+    Args:
+        path: a .csv file with a header and a record per row, a .jsonl file
+        with a record per line or a .json file with a list of records
+        steps: the steps of records which don't have their own
+        errors: 'raise' to raise a ValueError for an invalid record, 'skip'
+        to log a warning and continue with the next record
+
+    Returns:
+        specs: generator of specs
+    '''
+    for line, record in _records(path):
+        try:
+            spec = to_spec(record, steps)
+        except ValueError as e:
+            message = '{}:{}: {}'.format(path, line, e)
+            if errors == 'skip':
+                logger.warning('skipping record %s', message)
+                continue
+            raise ValueError(message) from None
+        yield spec
+
+
+def iter_companies(path, steps=None, errors='raise'):
+    '''stream the companies of a universe from a file, see iter_specs()
+
+    Each company is built and its steps are run, but not value().
+
+    Args:
+        path: a .csv, .jsonl or .json file
+        steps: the steps of records which don't have their own
+        errors: 'raise' or 'skip' invalid records
+
+    Returns:
+        companies: generator of companies
+    '''
+    for spec in iter_specs(path, steps, errors):
+        yield run_spec(spec, value=False)
+
+
+def read_specs(path):
+    '''read the specs of a universe from a file
+
+    Args:
+        path: a .json file with a list of specs, a .jsonl file with one
+        spec per line or a .csv file, see iter_specs()
+
+    Returns:
+        specs: list of specs
+    '''
+    return list(iter_specs(path))
+
+
+_workbooks = {}
+
+
+def _read_workbook(path):
+    '''parse a filled-in company template, see read_workbook()'''
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        args = {}
+        for row in wb['report'].iter_rows(max_col=2, values_only=True):
+            if len(row) == 2 and row[0] in LABELS and row[1] is not None:
+                args[LABELS[row[0]]] = row[1]
+        if isinstance(args.get('dividend'), str):
+            args['dividend'] = _cell(args['dividend'])
+        financials = {}
+        for row in wb['raw data'].iter_rows(values_only=True):
+            if not row or row[0] not in FINANCIALS:
+                continue
+            values = list(row[1:])
+            while values and values[-1] is None:
+                values.pop()
+            if not values:
+                continue
+            if row[0] == 'date':
+                date = values[0]
+                financials['date'] = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+                args.setdefault('year', len(values)-1)
+            else:
+                financials[row[0]] = values[0] if row[0] in BASELINE else values
+    finally:
+        wb.close()
+    ticker = args.pop('ticker', None) or os.path.splitext(os.path.basename(path))[0]
+    return to_spec({'ticker': ticker, 'args': args, 'financials': financials})
+
+
+def _parse(path):
+    '''_read_workbook() for a worker process, returning the error instead
+    of raising it'''
+    try:
+        return _read_workbook(path), None
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+
+
+def read_workbook(path):
+    '''the spec of a filled-in company template
+
+    The constructor arguments are read from the labels in the first column
+    of the report sheet (see LABELS) and the financials from the rows of the
+    'raw data' sheet with a FINANCIALS key, the layout written by
+    company.display_fin(). A dividend policy of several periods is a text
+    of numbers separated by ';'. The forecast year is the number of dates. The
+    workbook is streamed in read-only mode with the values of the cells, and
+    parsed again only when the file is modified.
+
+    Args:
+        path: an .xlsx file
+
+    Returns:
+        spec: dict without steps, see run_spec()
+    '''
+    path = os.path.normpath(path)
+    mtime = os.stat(path).st_mtime_ns
+    if path not in _workbooks or _workbooks[path][0] != mtime:
+        _workbooks[path] = (mtime, _read_workbook(path))
+    return copy.deepcopy(_workbooks[path][1])
+
+
+def read_workbooks(folder, workers=None):
+    '''the specs of all the filled-in company templates in a folder, see
+    read_workbook()
+
+    Only the workbooks which are new or modified since the last call are
+    parsed, on a process pool. Workbooks which can't be read are logged and
+    left out.
+
+    Args:
+        folder: folder of .xlsx files
+        workers: number of worker processes, default is the number of CPU's,
+        0 or 1 parses the workbooks in this process
+
+    Returns:
+        specs: list of specs in the order of the file names
+    '''
+    paths = [os.path.normpath(path) for path in sorted(glob.glob(os.path.join(folder, '*.xlsx')))
+             if not os.path.basename(path).startswith('~$')]
+    stale = []
+    for path in paths:
+        mtime = os.stat(path).st_mtime_ns
+        if path not in _workbooks or _workbooks[path][0] != mtime:
+            stale.append((path, mtime))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(stale) <= 1:
+        parsed = [_parse(path) for path, mtime in stale]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_parse, [path for path, mtime in stale],
+                                   chunksize=max(1, len(stale)//(4*workers))))
+
+    for (path, mtime), (spec, error) in zip(stale, parsed):
+        if error is not None:
+            logger.warning('could not read %s: %s', path, error)
+            _workbooks.pop(path, None)
+        else:
+            _workbooks[path] = (mtime, spec)
+    return [copy.deepcopy(_workbooks[path][1]) for path in paths if path in _workbooks]
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise _Timeout()
+
+
+def run_spec(spec, value=True):
+    '''build and value one company from its spec
+
+    A spec is a dict with the keys:
+    ticker = ticker symbol
+    args = arguments of the company constructor, other than financials
+    financials = the financials dict
+    steps = ordered list of the method calls, each one a method name or a
+    [name, kwargs] pair, e.g. ['fcf_to_debt', {'leverage': 2.5}]. Methods with
+    a financials argument which isn't in kwargs are passed the financials
+    dict of the spec, load_financials() a copy of it. If there is no
+    load_financials() step the financials are passed to the constructor.
+    value() is run at the end if it isn't one of the steps.
+
+    Args:
+        spec: dict
+        value: run value() at the end
+
+    Returns:
+        c: the company
+    '''
+    financials = copy.deepcopy(spec.get('financials'))
+    steps = [[step, {}] if isinstance(step, str) else step for step in spec.get('steps', [])]
+    args = dict(spec.get('args', {}))
+    args.setdefault('ticker', spec.get('ticker'))
+    if financials is not None and 'load_financials' not in [name for name, kwargs in steps]:
+        args['financials'] = copy.deepcopy(financials)
+    c = company(**args)
+
+    if value is True and 'value' not in [name for name, kwargs in steps]:
+        steps.append(['value', {}])
+    for name, kwargs in steps:
+        if not (name.startswith(STEPS) or name == 'value'):
+            raise ValueError('{} is not a step which can be run from a spec'.format(name))
+        method = getattr(c, name)
+        kwargs = dict(kwargs)
+        if 'financials' in inspect.signature(method).parameters and 'financials' not in kwargs:
+            kwargs['financials'] = financials.copy() if name == 'load_financials' else financials
+        method(**kwargs)
+    return c
+
+
+def _run_chunk(specs, timeout=None, keep=False, quiet=True):
+    '''run a chunk of specs, capturing the errors of each ticker
+
+    Args:
+        specs: list of specs
+        timeout: seconds allowed for each spec, enforced with SIGALRM where
+        the platform has it and this is the main thread
+        keep: return the companies as well as the results
+        quiet: silence the logging of the package while the specs are run
+
+    Returns:
+        rows: list of result dicts, one for each spec
+        companies: list of (ticker, company) pairs if keep is True
+    '''
+    alarm = timeout is not None and hasattr(signal, 'SIGALRM')
+    if alarm and threading.current_thread() is not threading.main_thread():
+        # signal handlers can only be set in the main thread
+        logger.warning('the timeout of %s seconds is not enforced outside the main thread', timeout)
+        alarm = False
+    # unless the package is already silenced
+    quiet = quiet is True and logging.getLogger('finagle').level <= logging.CRITICAL
+    rows = []
+    companies = []
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _alarm)
+    if quiet:
+        silent()
+    try:
+        for spec in specs:
+            row = {'ticker': spec.get('ticker'), 'status': 'ok', 'error': None}
+            start = time.perf_counter()
+            try:
+                if alarm:
+                    signal.setitimer(signal.ITIMER_REAL, timeout)
+                try:
+                    c = run_spec(spec)
+                finally:
+                    if alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                for key in RESULTS:
+                    row[key] = c.fin[key].iloc[0] if key in c.fin else np.nan
+                row['price'] = c.price
+                if keep is True:
+                    companies.append((row['ticker'], c))
+            except _Timeout:
+                row.update(status='timeout', error='exceeded {} seconds'.format(timeout))
+            except Exception as e:
+                row.update(status='error', error='{}: {}'.format(type(e).__name__, e))
+                logger.debug(traceback.format_exc())
+            row['seconds'] = time.perf_counter()-start
+            rows.append(row)
+    finally:
+        if alarm:
+            signal.signal(signal.SIGALRM, previous)
+        if quiet:
+            silent(False)
+    return rows, companies
+
+
+def _result(chunk, future, timeout):
+    '''wait for the results of a chunk run on the pool, see run_universe()
+
+    Args:
+        chunk: list of specs
+        future: future of _run_chunk()
+        timeout: seconds allowed for each spec
+
+    Returns:
+        rows, companies: as _run_chunk()
+    '''
+    wait = None
+    if timeout is not None and not hasattr(signal, 'SIGALRM'):
+        wait = timeout*len(chunk)
+    try:
+        return future.result(timeout=wait)
+    except concurrent.futures.TimeoutError:
+        return [{'ticker': spec.get('ticker'), 'status': 'timeout',
+                 'error': 'no result within {} seconds'.format(timeout*len(chunk))} for spec in chunk], []
+    except Exception as e:
+        return [{'ticker': spec.get('ticker'), 'status': 'error',
+                 'error': '{}: {}'.format(type(e).__name__, e)} for spec in chunk], []
+
+
+def run_universe(specs, workers=None, chunksize=None, timeout=None, keep=False, quiet=True):
+    '''value a universe of companies on a process pool
+
+    Each company is independent, the specs are split in chunks which are run
+    by a pool of worker processes. An error in one spec is recorded in the
+    results and doesn't affect the others.
+
+    Args:
+        specs: list or iterable of specs (see run_spec()), or the path of a
+        .csv, .jsonl or .json file of specs which is streamed by
+        iter_specs()
+        workers: number of worker processes, default is the number of CPU's,
+        0 or 1 runs the specs in this process
+        chunksize: number of specs sent to a worker at once, by default a
+        list of specs is split in about 4 chunks per worker and other
+        iterables in chunks of CHUNKSIZE
+        timeout: seconds allowed for each spec, enforced with SIGALRM.
+        Where the platform doesn't have it (Windows) a chunk which doesn't
+        return within timeout x chunksize of being waited on is recorded as
+        'timeout' instead
+        keep: also return the company objects, by ticker. The tickers must
+        be unique, a ValueError is raised for a ticker which is repeated
+        quiet: silence the logging of the companies, the errors are
+        reported in the results
+
+    Returns:
+        results: dataframe indexed by ticker with the status, the error
+        message, the year 0 values and the time taken for each spec
+        companies: dict of ticker to company, only if keep is True
+    '''
+    if isinstance(specs, str):
+        specs = iter_specs(specs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        # a stream of specs is sent in chunks of a fixed size
+        chunksize = max(1, len(specs)//(4*max(workers, 1))) if hasattr(specs, '__len__') else CHUNKSIZE
+    specs = iter(specs)
+    chunks = iter(lambda: list(itertools.islice(specs, chunksize)), [])
+
+    rows = []
+    companies = {}
+
+    def add(chunk_rows, chunk_companies):
+        rows.extend(chunk_rows)
+        for ticker, c in chunk_companies:
+            if ticker in companies:
+                raise ValueError('ticker {} is repeated, the companies are kept by ticker'.format(ticker))
+            companies[ticker] = c
+
+    if workers <= 1:
+        for chunk in chunks:
+            add(*_run_chunk(chunk, timeout, keep, quiet))
+    else:
+        # not a with block, which would wait for a worker stuck past its timeout
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        try:
+            # a few chunks per worker are read ahead, the rest of the specs
+            # stay in the file until a chunk is done
+            pending = collections.deque()
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    pending.append((chunk, pool.submit(_run_chunk, chunk, timeout, keep, quiet)))
+                while pending and (chunk is None or len(pending) > 2*workers):
+                    add(*_result(*pending.popleft(), timeout))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    results = pd.DataFrame(rows, columns=['ticker', 'status', 'error'] + RESULTS +
+                           ['price', 'seconds']).set_index('ticker')
+    failed = results['status'] != 'ok'
+    if failed.any():
+        logger.warning('run_universe() failed for %d of %d specs', failed.sum(), len(results))
+    logger.info('run_universe() complete')
+    if keep is True:
+        return results, companies
+    return results
+
+
+def implied_growth(companies, prices=None, mode='uniform', x0=None, **kwargs):
+    '''reverse DCF over a universe of companies
+
+    Runs company.implied_growth() for every company. The prices of each
+    company are solved at once, warm starts from a previous scan make a
+    rescan of the universe cheap.
+
+    Args:
+        companies: list of company objects, with the FCF's calculated
+        prices: dict of ticker to price (float or list), by default the
+        price attribute of each company
+        mode: 'uniform', 'scale' or 'roict', see company.implied_growth()
+        x0: warm starts, dict or series of ticker to a previous solution,
+        e.g. the 'implied' column of a previous scan
+        kwargs: passed to company.implied_growth()
+
+    Returns:
+        implied: dataframe with a row for every ticker and price, the
+        solution, the residual, whether it converged and the iterations used
+    '''
+    rows = []
+    for c in companies:
+        price = c.price if prices is None else prices[c.ticker]
+        start = None
+        if x0 is not None and c.ticker in x0:
+            start = np.asarray(x0[c.ticker], dtype=float)
+            if start.ndim == 0 or start.size == np.size(price):
+                start = start.reshape(np.shape(price))
+            else:
+                start = None
+        try:
+            c.implied_growth(price, mode=mode, x0=start, **kwargs)
+        except Exception:
+            logger.exception('implied_growth() failed for %s', c.ticker)
+            for p in np.atleast_1d(price):
+                rows.append({'ticker': c.ticker, 'price': p, 'implied': np.nan,
+                             'residual': np.nan, 'converged': False, 'iterations': 0})
+            continue
+        report = c.implied_report
+        for i, p in enumerate(np.atleast_1d(price)):
+            rows.append({'ticker': c.ticker, 'price': p, 'implied': report['implied'][i],
+                         'residual': report['residual'][i],
+                         'converged': bool(report['converged'][i]),
+                         'iterations': report['iterations']})
+    return pd.DataFrame(rows).set_index('ticker')
@@ -5,6 +5,7 @@ setup(
     name='finagle',
     url='https://github.com/mtlr05/finagle',
     packages=find_packages(include=['finagle', 'finagle.*']),
-    install_requires=['numpy','pandas','xlrd','datetime','openpyxl','scipy'],
+    install_requires=['numpy','pandas','datetime','openpyxl'],
+    extras_require={'parquet': ['pyarrow']},
     description='for the valuation of a company',
 )
\ No newline at end of file
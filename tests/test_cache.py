@@ -0,0 +1,67 @@
+import finagle as cmp
+from finagle import universe
+from finagle.cache import Cache
+import pandas as pd
+import os
+import copy
+
+def atkr_spec():
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    return {
+    'ticker' : 'ATKR',
+    'args' : {'rd' : 0.05, 're' : 0.09, 't' : 0.21, 'shares' : 46, 'gt' : 0.02, 'roict' : 0.17, 'year' : 10, 'dividend' : [0]},
+    'financials' : financials,
+    'steps' : [
+        ['forecast_ebitda', {'ebitda_ttm' : 881, 'gf' : [0.4756,-0.3233,-0.3096,0.10]}],
+        ['forecast_capex', {'capex_f' : [64,90,90,90]}],
+        'load_financials',
+        'fcf_from_ebitda',
+        ['fcf_to_debt', {'leverage' : 2, 'year_d' : 3}],
+        ['fcf_to_allocate', {'price' : 113, 'dp' : 'constant', 'buybacks' : [0.0,500,500,500,0]}],
+        ],
+    }
+
+def test_cache(tmp_path, monkeypatch):
+    # identical specs are calculated once, the disk store survives a new
+    # cache and is cleared by a new version
+    path = os.path.join(tmp_path, 'cache')
+    cache = Cache(maxsize=1, path=path)
+    spec = atkr_spec()
+    ATKR = cache.run(spec)
+    ATKR.fin['value_per_share'] = 0
+    same = copy.deepcopy(spec)
+    same['steps'].append('value')
+    result = cache.run(same)
+    assert cache.info()[:3] == (1, 1, 0)
+    pd.testing.assert_frame_equal(result.fin, universe.run_spec(spec).fin)
+
+    other = atkr_spec()
+    other['args']['re'] = 0.1
+    cache.run(other)
+    cache.run(spec)
+    assert cache.info() == (2, 2, 1, 1, 1)
+
+    cache = Cache(path=path)
+    cache.run(other)
+    assert cache.info()[:3] == (1, 0, 1)
+
+    monkeypatch.setattr(cmp, '__version__', 'new')
+    cache = Cache(path=path)
+    cache.run(other)
+    assert cache.info()[:3] == (0, 1, 0)
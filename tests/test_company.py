@@ -1,7 +1,11 @@
 import finagle as cmp
+from finagle import universe
 import pytest
 import pandas as pd
 import os
+import copy
+import logging
+import numpy as np
 
 def test_value():
     #Sample Problem 2
@@ -23,7 +27,6 @@ def test_value():
     filename=os.path.join(os.path.dirname(__file__), 'value.pkl')
     #answer = pd.read_pickle("./value.pkl")
     answer=pd.read_pickle(filename)
-    os.remove('abc.log')
     pd.testing.assert_frame_equal(answer, result)
 
 def test_fcf_from_earnings():
@@ -56,7 +59,6 @@ def test_fcf_from_earnings():
     filename=os.path.join(os.path.dirname(__file__), 'fcf_from_earnings.pkl')
     answer=pd.read_pickle(filename)
     #answer = pd.read_pickle("./fcf_from_earnings.pkl")
-    os.remove('xyz.log')
     pd.testing.assert_frame_equal(answer, result)
 
 def test_fcf_from_ebitda():
@@ -101,7 +103,6 @@ def test_fcf_from_ebitda():
     filename=os.path.join(os.path.dirname(__file__), 'fcf_from_ebitda.pkl')
     answer=pd.read_pickle(filename)
     #answer = pd.read_pickle("./fcf_from_ebitda.pkl")
-    os.remove('DISCK.log')
     pd.testing.assert_frame_equal(answer, result)
     
 def test_forecast_ebitda():
@@ -148,7 +149,6 @@ def test_forecast_ebitda():
     filename=os.path.join(os.path.dirname(__file__), 'forecast_ebitda.pkl')
     answer=pd.read_pickle(filename)
     #answer = pd.read_pickle("./forecast_ebitda.pkl")
-    os.remove('FRG.log')
     pd.testing.assert_frame_equal(answer, result)
 
 def test_fcf_to_acquire():
@@ -197,7 +197,6 @@ def test_fcf_to_acquire():
     filename=os.path.join(os.path.dirname(__file__), 'fcf_to_acquire.pkl')
     answer=pd.read_pickle(filename)
     #answer = pd.read_pickle("./fcf_to_acquire.pkl")
-    os.remove('FRG.log')
     pd.testing.assert_frame_equal(answer, result)
     
 def test_fcf_to_allocate():
@@ -245,5 +244,654 @@ def test_fcf_to_allocate():
     filename=os.path.join(os.path.dirname(__file__), 'fcf_to_allocate.pkl')
     answer=pd.read_pickle(filename)
     #answer = pd.read_pickle("./fcf_to_acquire.pkl")
-    os.remove('PL.log')
-    pd.testing.assert_frame_equal(answer, result)
\ No newline at end of file
+    pd.testing.assert_frame_equal(answer, result)
+def test_value_batch():
+    # scenarios from value_batch() at the current assumptions should match
+    # value(), and the value should fall as the cost of equity increases
+
+    #initializers
+    rd = 0.065
+    re = 0.10
+    t = 0.21
+    shares = 2.3 
+    gt = 0.02
+    roict=0.75
+    year = 10
+
+    #company input data
+    financials = {
+    'date' : '2021-12-31',
+    'revenue' :[0],
+    'ebitda' : [13.7,13.8,14.0,14.7,16.0,18.1,19.6,21.4,23.7,26.4,29.7],
+    'capex' :  [1.4,1.5,1.6,1.6,1.8,2.0,2.0,2.1,2.2,2.4,2.5],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],    
+    'dwc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [0.68],
+    'da' : [6.8,7.0,7.3,8.0,9.0],
+    'debt' :  [51.7,43.3,34.6,36.6,40.0,45.2,48.9,53.6,59.3,74.3,80],
+
+    'interest' : [3.6],
+    'cash' : 0,
+    'nol' : 0,
+    'noa' : 0,
+    }
+
+    DISCK = cmp.company(financials = financials,ticker = 'DISCK',rd = rd,re = re,t = t,shares = shares,gt = gt,roict = roict,year = year)
+    DISCK.fcf_from_ebitda()
+    DISCK.fcf_to_debt(leverage=2.5)
+    DISCK.fcf_to_buyback(price=28.22,dp = 'proportional')
+    DISCK.value()
+
+    result = DISCK.value_batch()
+    columns = ['equity', 'firm', 'DDM', 'value_per_share', 'value_per_share_DDM']
+    answer = DISCK.fin[columns].iloc[0]
+    pd.testing.assert_series_equal(answer, result[columns].iloc[0], check_names=False)
+
+    result = DISCK.value_batch(re=[0.08, 0.09, 0.10], gt=[0.01, 0.02], grid=True)
+    assert len(result) == 6
+    assert (result.groupby('gt')['value_per_share'].diff().dropna() < 0).all()
+
+def test_simulate():
+    # constant distributions reproduce the forecast_ebitda() based valuation
+
+    #initializers
+    rd = 0.065
+    re = 0.10
+    t = 0.21
+    shares = 0.744 + 40.295 
+    gt = 0.02
+    roict=0.15
+    year = 10
+
+    #company input data
+    financials = {
+    'date' : '2021-12-26',
+    'revenue' :[0],
+    'ebitda' : [330],
+    'capex' :  [40,46.0,50.6,55.7,61.2,67.3,73.2,78.6,83.3,87.2,90.1],
+    'dwc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],    
+    'tax' : [0],
+    'da' : [51.847,54.4],
+    'debt' :  [1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9], 
+
+    'interest' : [70],
+    'cash' : 159.72, 
+    'nol' : 127.4,
+    'noa' : 55.86,
+    }
+
+    FRG = cmp.company(ticker = 'FRG',rd = rd,re = re,t = t,shares = shares,gt = gt,roict = roict,year = year)
+    FRG.forecast_ebitda(330,[0.15,0.1,0.1,0.1,0.1], financials)
+    FRG.load_financials(financials = financials.copy())
+    FRG.fcf_from_ebitda()
+    FRG.fcf_to_debt(leverage=2.5)
+    FRG.fcf_to_buyback(price=43,dp = 'proportional')
+    FRG.value()
+
+    samples, summary = FRG.simulate([0.15,0.1,0.1,0.1,0.1], n=10)
+    answer = FRG.fin[['value_per_share', 'value_per_share_DDM']].iloc[0]
+    pd.testing.assert_series_equal(answer, samples[['value_per_share', 'value_per_share_DDM']].iloc[0], check_names=False)
+
+    samples, summary = FRG.simulate([lambda rng, n: rng.normal(0.15, 0.05, n), 0.1, 0.1, 0.1, 0.1], n=1000,
+                                    re=lambda rng, n: rng.uniform(0.09, 0.11, n), cap_frac=0.13, seed=0)
+    assert len(samples) == 1000
+    assert summary['value_per_share'].loc[0.05] < summary['value_per_share'].loc[0.5] < summary['value_per_share'].loc[0.95]
+
+def test_implied_growth():
+    # the value per share of a forecast is priced in by scaling its growth
+    # rates by 1, the roict solution is the roict of the model
+
+    #initializers
+    rd = 0.065
+    re = 0.10
+    t = 0.21
+    shares = 0.744 + 40.295 
+    gt = 0.02
+    roict=0.15
+    year = 10
+
+    #company input data
+    financials = {
+    'date' : '2021-12-26',
+    'revenue' :[0],
+    'ebitda' : [330],
+    'capex' :  [40,46.0,50.6,55.7,61.2,67.3,73.2,78.6,83.3,87.2,90.1],
+    'dwc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],    
+    'tax' : [0],
+    'da' : [51.847,54.4],
+    'debt' :  [1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9], 
+
+    'interest' : [70],
+    'cash' : 159.72, 
+    'nol' : 127.4,
+    'noa' : 55.86,
+    }
+
+    FRG = cmp.company(ticker = 'FRG',rd = rd,re = re,t = t,shares = shares,gt = gt,roict = roict,year = year)
+    FRG.forecast_ebitda(330,[0.15,0.1,0.1,0.1,0.1], financials)
+    FRG.load_financials(financials = financials.copy())
+    FRG.fcf_from_ebitda()
+    FRG.fcf_to_debt(leverage=2.5)
+    FRG.fcf_to_buyback(price=43,dp = 'proportional')
+    FRG.value()
+    price = FRG.fin['value_per_share'].iloc[0]
+
+    scale = FRG.implied_growth([price, price*1.2], mode='scale', gf=[0.15,0.1,0.1,0.1,0.1], tol=1e-9)
+    assert abs(scale[0]-1) < 1e-6
+    assert scale[1] > 1
+
+    implied = FRG.implied_growth(price, mode='roict', tol=1e-9)
+    assert abs(implied-roict) < 1e-6
+
+    # a warm started uniform growth scan over a universe
+    FRG.price = price
+    result = universe.implied_growth([FRG])
+    rescan = universe.implied_growth([FRG], x0=result['implied'])
+    assert result['converged'].all()
+    assert abs(rescan['implied'].iloc[0]-result['implied'].iloc[0]) < 1e-6
+    assert rescan['iterations'].iloc[0] <= result['iterations'].iloc[0]
+
+def test_fcf_to_debt_converges():
+    # the debt schedule is a fixed point: one more pass doesn't change it,
+    # and warm starting from the solution converges in a single pass
+
+    #initializers
+    rd = 0.065
+    re = 0.10
+    t = 0.21
+    shares = 2.3 
+    gt = 0.02
+    roict=0.75
+    year = 10
+
+    #company input data
+    financials = {
+    'date' : '2021-12-31',
+    'revenue' :[0],
+    'ebitda' : [13.7,13.8,14.0,14.7,16.0,18.1,19.6,21.4,23.7,26.4,29.7],
+    'capex' :  [1.4,1.5,1.6,1.6,1.8,2.0,2.0,2.1,2.2,2.4,2.5],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],    
+    'dwc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [0.68],
+    'da' : [6.8,7.0,7.3,8.0,9.0],
+    'debt' :  [51.7,43.3,34.6,36.6,40.0,45.2,48.9,53.6,59.3,74.3,80],
+
+    'interest' : [3.6],
+    'cash' : 0,
+    'nol' : 0,
+    'noa' : 0,
+    }
+
+    DISCK = cmp.company(financials = financials,ticker = 'DISCK',rd = rd,re = re,t = t,shares = shares,gt = gt,roict = roict,year = year)
+    DISCK.fcf_from_ebitda()
+    report = DISCK.fcf_to_debt(leverage=0.5, tol=1e-9)
+    assert report['converged'] is True
+    assert report['residual'] <= 1e-9
+
+    DISCK.fcf_from_ebitda()
+    report = DISCK.fcf_to_debt(leverage=0.5, tol=1e-9, warm_start=report['debt'])
+    assert report['iterations'] == 1
+
+    with pytest.raises(ValueError):
+        DISCK.fcf_to_debt(leverage=0.5, max_iter=0)
+
+def test_incremental_update():
+    # chained acquisitions, a disposal and a debt target only recalculate the
+    # years downstream of the change; the result should match a full
+    # fcf_from_ebitda()
+
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    for year_a in range(1, 10):
+        ATKR.fcf_to_acquire(year_a = year_a, ebitda_frac = 0.03, multiple = 6.5, leverage = 0.5, gnext = 0.1, cap_frac = 0.12, adjust_cash = False)
+    ATKR.noa_to_dispose(5, year_dis=4)
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+
+    result = ATKR.fin.copy()
+    ATKR.fcf_from_ebitda()
+    pd.testing.assert_frame_equal(ATKR.fin, result, rtol=1e-12)
+
+def test_sensitivity():
+    # the deal terms sweep matches fcf_to_acquire() followed by value() and
+    # the re x gt table matches value_batch()
+
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+    ATKR.value()
+
+    table = ATKR.sensitivity('re', [0.08, 0.09, 0.1], 'gt', [0.01, 0.02], sheet='re x gt')
+    answer = ATKR.value_batch(re=[0.08, 0.09, 0.1], gt=[0.01, 0.02], grid=True)
+    assert list(ATKR.sensitivities) == ['re x gt']
+    np.testing.assert_allclose(table.to_numpy().ravel(), answer['value_per_share'])
+
+    for year_a, adjust_cash in [(0, True), (2, False)]:
+        deal = {'year_a': year_a, 'ebitda_frac': 0.1, 'gnext': 0.05, 'cap_frac': 0.15, 'adjust_cash': adjust_cash}
+        table = ATKR.sensitivity('multiple', [6, 10], 'leverage', [0, 4], acquisition=deal)
+        for multiple, leverage in [(6, 0), (10, 4)]:
+            deal_atkr = copy.deepcopy(ATKR)
+            deal_atkr.fcf_to_acquire(multiple=multiple, leverage=leverage, **deal)
+            deal_atkr.value()
+            assert abs(table.loc[multiple, leverage]-deal_atkr.fin['value_per_share'].iloc[0]) < 1e-9
+
+    # an unknown parameter or a model without ebitda raises
+    with pytest.raises(ValueError):
+        ATKR.sensitivity('wacc', [0.08, 0.09], 'gt', [0.01, 0.02])
+    abc = cmp.company(financials = {'date' : '2021-12-31'}, ticker = 'abc', year = 2, fcfe = [0, 10, 11], re = 0.09, gt = 0.02)
+    with pytest.raises(ValueError):
+        abc.sensitivity('re', [0.08, 0.09], 'gt', [0.01, 0.02])
+
+def test_logging(tmp_path):
+    # no log file unless asked for, each ticker logs to its own logger and
+    # silent() switches everything off
+    logfile = os.path.join(tmp_path, 'abc.log')
+    abc = cmp.company(ticker = 'abc', fcfe = [1,1,1])
+    xyz = cmp.company(ticker = 'xyz', logfile = logfile)
+    assert abc.logfile is None
+    assert abc.log.name == 'finagle.company.abc'
+    assert not os.path.exists('abc.log')
+
+    xyz.log.info('message for xyz')
+    abc.log.info('message for abc')
+    cmp.silent()
+    xyz.log.error('silenced')
+    cmp.silent(False)
+    xyz.log.handlers[0].flush()
+    with open(logfile) as f:
+        text = f.read()
+    assert 'message for xyz' in text
+    assert 'abc' not in text
+    assert 'silenced' not in text
+    xyz.log.handlers[0].close()
+
+    # the level of the application is kept, and restored by silent(False)
+    package = logging.getLogger('finagle')
+    assert package.level == logging.NOTSET
+    package.setLevel(logging.WARNING)
+    cmp.silent()
+    assert package.level > logging.CRITICAL
+    cmp.silent(False)
+    assert package.level == logging.WARNING
+    package.setLevel(logging.NOTSET)
+
+def test_compact():
+    # the batch methods calculate from the compact container without
+    # building the dataframe again
+
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+    ATKR.value()
+    fin = ATKR.fin.drop(columns='debt_Target')
+    answer = ATKR.value_batch(re=[0.08, 0.09], gt=[0.01, 0.02], grid=True)
+
+    compacted = ATKR.compact()
+    assert compacted.values.shape == (len(fin.columns), len(fin))
+    assert compacted.nbytes <= fin.memory_usage(deep=True).sum()
+    result = ATKR.value_batch(re=[0.08, 0.09], gt=[0.01, 0.02], grid=True)
+    pd.testing.assert_frame_equal(result, answer)
+    assert ATKR.compacted is compacted
+
+    pd.testing.assert_frame_equal(ATKR.fin, fin, check_dtype=False, check_index_type=False, check_names=False)
+    assert ATKR.compacted is None
+
+def test_save_load(tmp_path):
+    # a loaded company has the same fin and state without running any
+    # method, and changing it doesn't change the file
+
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    ATKR.fcf_to_acquire(year_a = 1, ebitda_frac = 0.03, multiple = 6.5, leverage = 0.5, gnext = 0.1, cap_frac = 0.12, adjust_cash = False)
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+    ATKR.fcf_to_allocate(price=113, dp='constant', buybacks=[0.0,500,500,500,0])
+    ATKR.value()
+    ATKR.sensitivity('re', [0.08, 0.09], 'gt', [0.01, 0.02], sheet='re x gt')
+    path = os.path.join(tmp_path, 'ATKR.fin')
+    ATKR.save(path)
+
+    for mmap in [True, False]:
+        loaded = cmp.company.load(path, mmap=mmap)
+        pd.testing.assert_frame_equal(loaded.fin, ATKR.fin)
+        pd.testing.assert_frame_equal(loaded.sensitivities['re x gt'], ATKR.sensitivities['re x gt'])
+        for key in ['cash0', 'fcfet', 'vpsbb', 'buybacks', 'dividend', 'n_da', 'data_for_ebitda', 'now', 'dirty']:
+            assert getattr(loaded, key) == getattr(ATKR, key)
+            assert type(getattr(loaded, key)) is type(getattr(ATKR, key))
+
+    # the rest of the model continues from the loaded state
+    answer = copy.deepcopy(ATKR)
+    answer.fcf_to_debt(leverage=3)
+    answer.value()
+    loaded.fcf_to_debt(leverage=3)
+    loaded.value()
+    pd.testing.assert_frame_equal(loaded.fin, answer.fin)
+    pd.testing.assert_frame_equal(cmp.company.load(path).fin, ATKR.fin)
+
+    loaded = cmp.company.load(path, compact=True)
+    assert loaded.compacted is not None
+    pd.testing.assert_frame_equal(loaded.value_batch(re=[0.08, 0.09]), ATKR.value_batch(re=[0.08, 0.09]))
+
+def test_fork():
+    # branches off a fork match branches off a deep copy, the base case is
+    # unchanged and the columns which aren't changed are shared
+
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+    ATKR.value()
+    base = copy.deepcopy(ATKR)
+
+    for buybacks in [[0.0,500,500,500,0], [0.0,100]]:
+        fork = ATKR.fork()
+        answer = copy.deepcopy(ATKR)
+        for c in [fork, answer]:
+            c.fcf_to_allocate(price=113, dp='constant', buybacks=buybacks)
+            c.value()
+        pd.testing.assert_frame_equal(fork.fin, answer.fin)
+        assert np.shares_memory(fork.fin['ebitda'].to_numpy(), ATKR.fin['ebitda'].to_numpy())
+        assert not np.shares_memory(fork.fin['shares'].to_numpy(), ATKR.fin['shares'].to_numpy())
+
+    fork = ATKR.fork()
+    fork.fcf_to_acquire(year_a = 1, ebitda_frac = 0.03, multiple = 6.5, leverage = 0.5, gnext = 0.1, cap_frac = 0.12, adjust_cash = False)
+    fork.fcf_to_debt(leverage=2, year_d=3)
+    fork.value()
+    pd.testing.assert_frame_equal(ATKR.fin, base.fin)
+    for c in [ATKR, base]:
+        c.noa_to_dispose(5, year_dis=4)
+    assert fork.fin['MnA'].iloc[4] == 0
+    pd.testing.assert_frame_equal(ATKR.fin, base.fin)
+
+    # a consolidated dataframe is split into a column array each
+    ATKR.fin = ATKR.fin.copy()
+    fork = ATKR.fork()
+    fork.fcf_to_allocate(price=113, dp='constant', buybacks=[0.0,500])
+    pd.testing.assert_frame_equal(ATKR.fin, base.fin)
+    assert np.shares_memory(fork.fin['ebitda'].to_numpy(), ATKR.fin['ebitda'].to_numpy())
+
+def test_period():
+    # quarterly dates step by calendar quarters from a month end, the annual
+    # rates are converted to each quarter, and a long quarterly model can be
+    # valued, see benchmarks/bench.py for its timing
+    rq = 1.09**0.25-1
+    gq = 1.02**0.25-1
+    fcfe = [0]+[10*(1+gq)**i for i in range(40)]
+    abc = cmp.company(financials = {'date' : '2021-9-30'}, ticker = 'abc', year = 40, fcfe = fcfe, re = 0.09, gt = 0.02, period = 'quarterly')
+    abc.value()
+    assert list(abc.fin.index[:4].strftime('%Y-%m-%d')) == ['2021-09-30', '2021-12-31', '2022-03-31', '2022-06-30']
+    assert abc.fin.index[-1] == pd.Timestamp('2031-09-30')
+    assert abc.fin['equity'].iloc[0] == pytest.approx(10/(rq-gq), rel=1e-12)
+
+    with pytest.raises(ValueError):
+        cmp.company(ticker = 'abc', period = 'weekly')
+
+    year = 400
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [220],
+    'dwc' : [0]*(year+1),
+    'sbc' : [0]*(year+1),
+    'tax' : [48],
+    'da' : [20],
+    'debt' :  [759]*(year+1),
+    'interest' : [8],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 0,
+    }
+    Q = cmp.company(ticker = 'Q',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = year, dividend = [0], period = 'quarterly')
+    Q.forecast_ebitda(220,[0.1,0.05,0.02], financials)
+    Q.forecast_capex([16,22],financials)
+    Q.load_financials(financials = financials.copy())
+    Q.fcf_from_ebitda()
+    Q.fcf_to_debt(leverage=2, year_d=3)
+    Q.fcf_to_allocate(price=113, dp='proportional', buybacks=[0.0,100,100])
+    Q.value()
+    assert np.isfinite(Q.fin['value_per_share'].iloc[0])
+
+def test_fcf_to_acquire_program():
+    # a program of deals matches fcf_to_acquire() for each deal in order
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    program = copy.deepcopy(ATKR)
+
+    deals = {'year_a': [0, 3, 1, 5, 5, 9], 'ebitda_frac': [0.05, 0.03, 0.04, 0.02, 0.01, 0.03],
+             'multiple': [8, 6.5, 7, 6.5, 9, 6.5], 'leverage': [2, 0.5, 1, 0.5, 3, 0.5],
+             'gnext': [0.1, 0.1, 0.05, 0.2, 0.1, 0.1], 'cap_frac': [0.12, 0.12, 0.2, 0.12, 0.1, 0.12]}
+    dEbitda = []
+    for deal in zip(*deals.values()):
+        dEbitda.append(ATKR.fcf_to_acquire(adjust_cash = True, **dict(zip(deals, deal))))
+    result = program.fcf_to_acquire_program(adjust_cash = True, **deals)
+
+    np.testing.assert_allclose(result, dEbitda, rtol=1e-12)
+    pd.testing.assert_frame_equal(program.fin, ATKR.fin, rtol=1e-12)
+    assert program.n_da == ATKR.n_da
+    assert program.cash0 == pytest.approx(ATKR.cash0, rel=1e-12)
+
+    for c in [ATKR, program]:
+        c.fcf_to_debt(leverage=2, year_d=3)
+        c.value()
+    pd.testing.assert_frame_equal(program.fin, ATKR.fin, rtol=1e-12)
+
+def test_simulate_allocation():
+    # without volatility every path matches fcf_to_allocate() at a constant
+    # price, the paths are reproducible with a seed
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+    fin = ATKR.fin.copy()
+
+    for buybacks in [None, [0.0,100,100,100]]:
+        table = ATKR.simulate_allocation(113, paths=3, sigma=0, buybacks=buybacks)
+        answer = copy.deepcopy(ATKR)
+        answer.fcf_to_allocate(113, dp='constant', buybacks=buybacks)
+        answer.value()
+        assert list(table['value_per_share_DDM']) == pytest.approx([answer.fin['value_per_share_DDM'].iloc[0]]*3, rel=1e-12)
+        assert list(table['shares']) == pytest.approx([answer.fin['shares'].iloc[-1]]*3, rel=1e-12)
+    pd.testing.assert_frame_equal(ATKR.fin, fin)
+
+    for model in ['gbm', 'multiple']:
+        table = ATKR.simulate_allocation(113, paths=20000, model=model, buybacks=[0.0,100,100,100], seed=1)
+        assert list(table.columns) == ['price', 'shares', 'value_per_share_DDM', 'excess']
+        assert len(table) == 20000
+        assert table['value_per_share_DDM'].std() > 0
+        pd.testing.assert_frame_equal(table, ATKR.simulate_allocation(113, paths=20000, model=model,
+                                                                      buybacks=[0.0,100,100,100], seed=1))
+    base = table['value_per_share_DDM'] - table['excess']
+    assert np.allclose(base, base.iloc[0])
+
+def test_value_derivatives():
+    # derivatives from value(derivatives=True) should match central
+    # differences of value_batch()
+
+    #initializers
+    rd = 0.065
+    re = 0.10
+    t = 0.21
+    shares = 2.3 
+    gt = 0.02
+    roict=0.75
+    year = 10
+
+    #company input data
+    financials = {
+    'date' : '2021-12-31',
+    'revenue' :[0],
+    'ebitda' : [13.7,13.8,14.0,14.7,16.0,18.1,19.6,21.4,23.7,26.4,29.7],
+    'capex' :  [1.4,1.5,1.6,1.6,1.8,2.0,2.0,2.1,2.2,2.4,2.5],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],    
+    'dwc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [0.68],
+    'da' : [6.8,7.0,7.3,8.0,9.0],
+    'debt' :  [51.7,43.3,34.6,36.6,40.0,45.2,48.9,53.6,59.3,74.3,80],
+
+    'interest' : [3.6],
+    'cash' : 0,
+    'nol' : 0,
+    'noa' : 0,
+    }
+
+    DISCK = cmp.company(financials = financials,ticker = 'DISCK',rd = rd,re = re,t = t,shares = shares,gt = gt,roict = roict,year = year)
+    DISCK.fcf_from_ebitda()
+    DISCK.fcf_to_debt(leverage=2.5)
+    DISCK.fcf_to_buyback(price=28.22,dp = 'proportional')
+    DISCK.value(derivatives=True)
+
+    columns = ['value_per_share', 'value_per_share_DDM']
+    h = 1e-6
+    for key in ['re', 'rd', 'gt', 'roict', 't']:
+        x = getattr(DISCK, key)
+        result = DISCK.value_batch(**{key: [x-h, x+h]})[columns]
+        answer = (result.iloc[1]-result.iloc[0])/(2*h)
+        np.testing.assert_allclose(DISCK.derivatives.loc[key, columns], answer, rtol=1e-5)
+
+    # growth in year 3 scales the ebitda and capex from year 3 onwards
+    ebitda = DISCK.fin['ebitda'].to_numpy(dtype=float)
+    g = ebitda[3]/ebitda[2]-1
+    values = []
+    for dg in [-h, h]:
+        c = copy.deepcopy(DISCK)
+        scale = np.where(np.arange(len(ebitda)) >= 3, (1+g+dg)/(1+g), 1)
+        c.fin['ebitda'] = ebitda*scale
+        c.fin['capex'] = c.fin['capex'].to_numpy(dtype=float)*scale
+        values.append(c.value_batch()[columns].iloc[0])
+    answer = (values[1]-values[0])/(2*h)
+    np.testing.assert_allclose(DISCK.derivatives.loc['g3', columns], answer, rtol=1e-5)
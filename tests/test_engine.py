@@ -0,0 +1,91 @@
+from finagle import engine
+import numpy as np
+
+
+def test_nol_carryforward():
+    # compare the closed form against the year by year recursion
+    income = np.array([[5, -20, 10, 30, -5, 40], [0, 50, 50, -10, 10, 10]], dtype=float)
+    nol0 = np.array([12, 0])
+
+    result = engine.nol_carryforward(nol0, income)
+
+    answer = np.empty(income.shape)
+    answer[:, 0] = nol0
+    for i in range(1, income.shape[1]):
+        answer[:, i] = np.maximum(answer[:, i-1] - income[:, i], 0)
+    np.testing.assert_allclose(result, answer)
+
+
+def test_stream():
+    # forecast values are kept and the balance is interpolated to the
+    # terminal value, one row for each terminal value
+    result = engine.stream([1, 2], np.array([7, 12]), 5)
+    answer = np.array([[1, 2, 3.25, 4.5, 5.75, 7], [1, 2, 4.5, 7, 9.5, 12]])
+    np.testing.assert_allclose(result, answer)
+
+
+def test_pv():
+    # compare the discount factor kernel against the backward recursion for
+    # a batch of cash flows and rate curves over a long horizon
+    rng = np.random.default_rng(0)
+    cfs = rng.normal(100, 30, (5, 201))
+    r = rng.uniform(0.05, 0.12, (5, 201))
+    g = np.full(5, 0.02)
+
+    result = engine.pv(cfs, r, g)
+
+    answer = np.empty(cfs.shape)
+    answer[:, -1] = cfs[:, -1]*(1+g)/(r[:, -1]-g)
+    for i in range(cfs.shape[1]-2, -1, -1):
+        answer[:, i] = (cfs[:, i+1]+answer[:, i+1])/(1+r[:, i])
+    np.testing.assert_allclose(result, answer, rtol=1e-12)
+
+
+def test_root():
+    # roots of a batch of cubics, with and without a warm start
+    c = np.array([1, 8, 27, -64], dtype=float)
+
+    x, fx, converged, iterations = engine.root(lambda x: x**3 - c, -10, 10, tol=1e-10)
+    np.testing.assert_allclose(x, np.cbrt(c), rtol=1e-8)
+    assert converged.all()
+
+    x, fx, converged, iterations = engine.root(lambda x: x**3 - c, -10, 10, x0=np.cbrt(c)+0.01, tol=1e-10)
+    np.testing.assert_allclose(x, np.cbrt(c), rtol=1e-8)
+
+    # no root inside the limits
+    x, fx, converged, iterations = engine.root(lambda x: x**3 - c, 0, 2)
+    assert np.isnan(x[2:]).all()
+    assert not converged[2:].any()
+
+
+def test_allocate():
+    # a vector of entry prices matches the year by year recursion of each
+    # price, with the price ratchet of the proportional mode
+    rng = np.random.default_rng(1)
+    year = 12
+    buybacks = rng.uniform(0, 50, year+1)
+    fcfe = buybacks + rng.uniform(0, 10, year+1)
+    ebitda = 100*1.05**np.arange(year+1)*rng.uniform(0.8, 1.2, year+1)
+    debt = np.full(year+1, 300.)
+    price = np.array([20, 35, 60.])
+
+    for dp in ['constant', 'proportional']:
+        shares, prices, dividend = engine.allocate(price, 40, buybacks, fcfe, 25, dp, ebitda, debt)
+        assert shares.shape == prices.shape == dividend.shape == (3, year+1)
+        for k, p in enumerate(price):
+            s = np.full(year+1, 40.)
+            q = np.full(year+1, p)
+            multiple = (p*40 + 300 - 25)/ebitda[1]
+            for i in range(year):
+                s[i+1] = s[i] - buybacks[i+1]/q[i]
+                if dp == 'proportional':
+                    q[i+1] = max((multiple*ebitda[min(i+2, year)] - debt[i+1])/s[i+1], q[i]) if i < year-1 else q[i]
+            np.testing.assert_allclose(shares[k], s, rtol=1e-12)
+            np.testing.assert_allclose(prices[k], q, rtol=1e-12)
+            d = (fcfe-buybacks)/s
+            d[1] = (fcfe[1]+25-buybacks[1])/s[1]
+            np.testing.assert_allclose(dividend[k], d, rtol=1e-12)
+
+    # a flat price path is the constant price
+    shares, prices, dividend = engine.allocate(np.repeat(price[:, None], year+1, axis=1), 40, buybacks, fcfe, 25, 'path')
+    np.testing.assert_allclose(shares, engine.allocate(price, 40, buybacks, fcfe, 25)[0], rtol=1e-12)
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import os
+import json
+
+# seconds which importing finagle may add to importing numpy and pandas
+BUDGET = 0.25
+
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import numpy, pandas
+middle = time.perf_counter()
+import finagle
+end = time.perf_counter()
+print(json.dumps({'pandas': middle-start, 'finagle': end-middle,
+                  'modules': [m for m in ('scipy', 'openpyxl', 'xlrd') if m in sys.modules],
+                  'chained_assignment': pandas.get_option('mode.chained_assignment')}))
+'''
+
+def test_import():
+    # the optional dependencies are imported when used and the pandas options
+    # are left alone; the best of a few runs is compared with the budget
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root+os.pathsep+os.environ.get('PYTHONPATH', ''))
+    runs = []
+    for i in range(3):
+        output = subprocess.run([sys.executable, '-c', SCRIPT], env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout))
+
+    assert runs[0]['modules'] == []
+    assert runs[0]['chained_assignment'] == 'warn'
+    assert min(run['finagle'] for run in runs) < BUDGET
@@ -0,0 +1,87 @@
+import finagle as cmp
+from finagle import report
+import pytest
+import os
+from openpyxl import load_workbook
+
+def frg():
+    #company input data
+    financials = {
+    'date' : '2021-12-26',
+    'revenue' :[0],
+    'ebitda' : [330],
+    'capex' :  [40,46.0,50.6,55.7,61.2,67.3,73.2,78.6,83.3,87.2,90.1],
+    'dwc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [0],
+    'da' : [51.847,54.4],
+    'debt' :  [1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9,1072.9],
+
+    'interest' : [70],
+    'cash' : 159.72,
+    'nol' : 127.4,
+    'noa' : 55.86,
+    }
+
+    FRG = cmp.company(ticker = 'FRG',rd = 0.065,re = 0.10,t = 0.21,shares = 41.039,gt = 0.02,roict = 0.15,year = 10)
+    FRG.forecast_ebitda(330,[0.15,0.1,0.1,0.1,0.1], financials)
+    FRG.load_financials(financials = financials.copy())
+    FRG.fcf_from_ebitda()
+    FRG.fcf_to_debt(leverage=2.5)
+    FRG.fcf_to_buyback(price=43,dp = 'proportional')
+    FRG.value()
+    return FRG
+
+def test_display_fin(tmp_path):
+    # the cached template is restored after each report
+    FRG = frg()
+    FRG.sensitivity('re', [0.09, 0.1], 'gt', [0.01, 0.02], sheet='re x gt')
+    first = os.path.join(tmp_path, 'first.xlsx')
+    second = os.path.join(tmp_path, 'second.xlsx')
+    table = FRG.display_fin(filename=first)
+    FRG.sensitivities = {}
+    FRG.display_fin(filename=second)
+
+    assert list(table.index) == report.TABLE
+    wb = load_workbook(first)
+    assert wb.sheetnames == ['report', 'raw data', 'keys', 're x gt']
+    assert wb['report']['B2'].value == 'FRG'
+    rows = list(wb['raw data'].values)
+    assert rows[0][0] == 'date'
+    assert [row[0] for row in rows[2:]] == list(FRG.fin.columns)
+    assert rows[2+list(FRG.fin.columns).index('ebitda')][1] == 330
+
+    wb = load_workbook(second)
+    assert wb.sheetnames == ['report', 'raw data', 'keys']
+    assert list(wb['raw data'].values) == rows
+
+def test_save_workbook(tmp_path):
+    # a summary sheet and a sheet for each ticker
+    FRG = frg()
+    filename = os.path.join(tmp_path, 'universe.xlsx')
+    report.save_workbook([FRG], filename, style=True)
+
+    wb = load_workbook(filename)
+    assert wb.sheetnames == ['summary', 'FRG']
+    summary = list(wb['summary'].values)
+    assert summary[0] == tuple(report.SUMMARY)
+    assert summary[1][summary[0].index('value_per_share')] == pytest.approx(FRG.fin['value_per_share'].iloc[0])
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_write_dataset(tmp_path, fmt):
+    # batches and runs are read back as one table
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    FRG = frg()
+    root = os.path.join(tmp_path, 'dataset')
+    report.write_dataset([FRG, FRG], root, run_date='2022-01-03', fmt=fmt, batch=1)
+    FRG.re = 0.11
+    FRG.to_dataset(root, run_date='2022-01-04', fmt=fmt)
+
+    result = report.read_dataset(root)
+    assert len(result) == 3*len(FRG.fin)
+    result = report.read_dataset(root, run_date='2022-01-04', tickers=['FRG'])
+    assert len(result) == len(FRG.fin)
+    assert (result['re'] == 0.11).all()
+    assert list(result['fcfe']) == pytest.approx(list(FRG.fin['fcfe']))
+    assert list(result['year']) == list(range(len(FRG.fin)))
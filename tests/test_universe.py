@@ -0,0 +1,211 @@
+import finagle as cmp
+from finagle import universe
+import pytest
+import pandas as pd
+import os
+import copy
+import json
+import logging
+import signal
+import threading
+
+def atkr_spec():
+    #company input data
+    financials = {
+    'date' : '2021-9-30',
+    'ebitda' : [881],
+    'capex' :  [64,90,90,90],
+    'dwc' : [0,448.5,0,0,0,0,0,0,0,0,0],
+    'sbc' : [0,0,0,0,0,0,0,0,0,0,0],
+    'tax' : [192],
+    'da' : [79,79],
+    'debt' :  [759,759,759,759,759,759,759,759,759,759,759],
+
+    'interest' : [33],
+    'cash' : 390.4,
+    'nol' : 0,
+    'noa' : 10,
+    }
+
+    return {
+    'ticker' : 'ATKR',
+    'args' : {'rd' : 0.05, 're' : 0.09, 't' : 0.21, 'shares' : 46, 'gt' : 0.02, 'roict' : 0.17, 'year' : 10, 'dividend' : [0]},
+    'financials' : financials,
+    'steps' : [
+        ['forecast_ebitda', {'ebitda_ttm' : 881, 'gf' : [0.4756,-0.3233,-0.3096,0.10]}],
+        ['forecast_capex', {'capex_f' : [64,90,90,90]}],
+        'load_financials',
+        'fcf_from_ebitda',
+        ['fcf_to_debt', {'leverage' : 2, 'year_d' : 3}],
+        ['fcf_to_allocate', {'price' : 113, 'dp' : 'constant', 'buybacks' : [0.0,500,500,500,0]}],
+        ],
+    }
+
+def test_run_spec():
+    # a spec gives the same model as the method calls
+    spec = atkr_spec()
+    financials = copy.deepcopy(spec['financials'])
+
+    ATKR = cmp.company(ticker = 'ATKR',rd = 0.05,re = 0.09,t = 0.21,shares = 46,gt = 0.02,roict = 0.17,year = 10, dividend = [0])
+    ATKR.forecast_ebitda(881,[0.4756,-0.3233,-0.3096,0.10], financials)
+    ATKR.forecast_capex(financials['capex'],financials)
+    ATKR.load_financials(financials = financials.copy())
+    ATKR.fcf_from_ebitda()
+    ATKR.fcf_to_debt(leverage=2, year_d=3)
+    ATKR.fcf_to_allocate(price=113, dp='constant', buybacks=[0.0,500,500,500,0])
+    ATKR.value()
+
+    result = universe.run_spec(spec)
+    pd.testing.assert_frame_equal(result.fin, ATKR.fin)
+
+def test_run_universe(tmp_path):
+    # errors are captured for each ticker, serial and pool runs agree
+    specs = [atkr_spec()]
+    for ticker in ['A1', 'A2']:
+        spec = atkr_spec()
+        spec['ticker'] = ticker
+        specs.append(spec)
+    bad = atkr_spec()
+    bad['ticker'] = 'BAD'
+    del bad['financials']['debt']
+    specs.append(bad)
+    path = os.path.join(tmp_path, 'specs.jsonl')
+    with open(path, 'w') as f:
+        for spec in specs:
+            f.write(json.dumps(spec)+'\n')
+
+    serial = universe.run_universe(specs, workers=1)
+    pool = universe.run_universe(path, workers=2, chunksize=1, timeout=60)
+
+    assert list(serial['status']) == ['ok', 'ok', 'ok', 'error']
+    assert 'debt' in serial.loc['BAD', 'error']
+    pd.testing.assert_frame_equal(serial.drop(columns='seconds'), pool.drop(columns='seconds'))
+    assert serial.loc['A1', 'value_per_share'] == serial.loc['ATKR', 'value_per_share']
+
+    # the companies are kept by ticker, which must be unique
+    results, companies = universe.run_universe(specs[:2], workers=1, keep=True)
+    assert list(companies) == ['ATKR', 'A1']
+    with pytest.raises(ValueError, match='ATKR'):
+        universe.run_universe([specs[0], specs[0]], workers=1, keep=True)
+
+def test_run_universe_timeout(monkeypatch):
+    # the timeout isn't enforced off the main thread, and the signal handler
+    # and the logging are restored after an interrupt
+    results = []
+    thread = threading.Thread(target=lambda: results.append(universe.run_universe([atkr_spec()], workers=1, timeout=5)))
+    thread.start()
+    thread.join()
+    assert list(results[0]['status']) == ['ok']
+
+    if hasattr(signal, 'SIGALRM'):
+        handler = signal.getsignal(signal.SIGALRM)
+        def interrupt(spec):
+            raise KeyboardInterrupt()
+        monkeypatch.setattr(universe, 'run_spec', interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            universe.run_universe([atkr_spec()], workers=1, timeout=5)
+        assert signal.getsignal(signal.SIGALRM) is handler
+        assert logging.getLogger('finagle').level <= logging.CRITICAL
+
+def test_iter_specs(tmp_path):
+    # flat csv and jsonl records stream as specs which run like the
+    # hand-built spec, invalid records are reported with their line
+    spec = atkr_spec()
+    steps = spec['steps']
+    fields = ['ticker', 'date', 'ebitda', 'capex', 'dwc', 'sbc', 'tax', 'da', 'debt', 'interest', 'cash', 'nol', 'noa',
+              'rd', 're', 't', 'shares', 'gt', 'roict', 'year', 'dividend']
+    record = dict(spec['financials'], ticker='ATKR', **spec['args'])
+    path = os.path.join(tmp_path, 'universe.csv')
+    with open(path, 'w') as f:
+        f.write(','.join(fields)+'\n')
+        row = [json.dumps(record[key]) if isinstance(record[key], list) else str(record[key]) for key in fields]
+        row[fields.index('dwc')] = ';'.join(str(v) for v in record['dwc'])
+        f.write(','.join('"{}"'.format(v) for v in row)+'\n')
+        f.write(','.join('"{}"'.format(v) for v in row).replace('ATKR', 'A2')+'\n')
+        f.write(','.join('"{}"'.format(v) for v in row).replace('2021-9-30', 'Sept 21')+'\n')
+
+    specs = universe.iter_specs(path, steps=steps)
+    first = next(specs)
+    assert first['ticker'] == 'ATKR'
+    assert first['financials'] == spec['financials']
+    assert first['args'] == spec['args']
+    assert next(specs)['ticker'] == 'A2'
+    with pytest.raises(ValueError, match='universe.csv:4'):
+        next(specs)
+
+    results = universe.run_universe(universe.iter_specs(path, steps=steps, errors='skip'), workers=2, chunksize=1)
+    answer = universe.run_universe([spec], workers=1)
+    assert list(results.index) == ['ATKR', 'A2']
+    assert results.loc['A2', 'value_per_share'] == answer.loc['ATKR', 'value_per_share']
+
+    path = os.path.join(tmp_path, 'universe.jsonl')
+    with open(path, 'w') as f:
+        f.write(json.dumps(record)+'\n')
+        f.write(json.dumps(dict(record, ticker='BAD', leverage=2))+'\n')
+    companies = universe.iter_companies(path, steps=steps[:4], errors='skip')
+    ATKR = next(companies)
+    assert ATKR.data_for_ebitda is True
+    assert 'value_per_share' not in ATKR.fin
+    assert list(companies) == []
+
+def test_read_workbooks(tmp_path, monkeypatch):
+    # a report written from the template reads back as the same model, and
+    # only the modified workbooks are parsed again
+    spec = atkr_spec()
+    spec['steps'] = spec['steps'][:4]
+    ATKR = universe.run_spec(spec, value=False)
+    ATKR.value()
+    for ticker in ['ATKR', 'A2', 'A3']:
+        ATKR.ticker = ticker
+        ATKR.display_fin(filename=os.path.join(tmp_path, ticker+'.xlsx'))
+
+    result = universe.read_workbook(os.path.join(tmp_path, 'ATKR.xlsx'))
+    assert result['args'] == {'rd': 0.05, 're': 0.09, 'gt': 0.02, 't': 0.21, 'shares': 46, 'roict': 0.17, 'year': 10,
+                              'period': 'annual', 'price': 0, 'dividend': 0}
+    assert result['financials']['date'] == '2021-09-30'
+    assert result['financials']['cash'] == 390.4
+    assert result['financials']['ebitda'] == pytest.approx(list(ATKR.fin['ebitda']))
+    result['steps'] = ['fcf_from_ebitda']
+    c = universe.run_spec(result)
+    assert c.fin['value_per_share'].iloc[0] == pytest.approx(ATKR.fin['value_per_share'].iloc[0], rel=1e-12)
+
+    specs = universe.read_workbooks(tmp_path, workers=2)
+    assert [s['ticker'] for s in specs] == ['A2', 'A3', 'ATKR']
+
+    parsed = []
+    read = universe._read_workbook
+    monkeypatch.setattr(universe, '_read_workbook', lambda path: parsed.append(os.path.basename(path)) or read(path))
+    path = os.path.join(tmp_path, 'A3.xlsx')
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns+10**9))
+    assert universe.read_workbooks(tmp_path, workers=1) == specs
+    assert parsed == ['A3.xlsx']
+
+def test_read_workbook_inputs(tmp_path):
+    # the purchases of an acquisition, a quarterly period, the share price,
+    # the effective tax and the dividend policy read back from a report
+    spec = atkr_spec()
+    spec['steps'] = spec['steps'][:4] + [['fcf_to_acquire', {'year_a' : 2, 'ebitda_frac' : 0.2, 'multiple' : 10, 'adjust_cash' : False}]]
+    ATKR = universe.run_spec(spec)
+    path = os.path.join(tmp_path, 'ATKR.xlsx')
+    ATKR.display_fin(filename=path)
+    result = universe.read_workbook(path)
+    assert result['financials']['MnA'] == pytest.approx(list(ATKR.fin['MnA']))
+    assert result['financials']['MnA'][2] > 0
+    result['steps'] = ['fcf_from_ebitda']
+    c = universe.run_spec(result)
+    for key in ['value_per_share', 'value_per_share_DDM']:
+        assert c.fin[key].iloc[0] == pytest.approx(ATKR.fin[key].iloc[0], rel=1e-12)
+
+    spec = atkr_spec()
+    spec['steps'] = spec['steps'][:4]
+    spec['args'].update({'period' : 'quarterly', 'price' : 113, 'te' : 0.15, 'dividend' : [0.5, 0.6]})
+    ATKR = universe.run_spec(spec)
+    ATKR.display_fin(filename=path)
+    result = universe.read_workbook(path)
+    for key in ['period', 'price', 'te', 'dividend']:
+        assert result['args'][key] == spec['args'][key]
+    result['steps'] = ['fcf_from_ebitda']
+    c = universe.run_spec(result)
+    assert c.fin['price'].iloc[0] == 113
+    for key in ['value_per_share', 'value_per_share_DDM']:
+        assert c.fin[key].iloc[0] == pytest.approx(ATKR.fin[key].iloc[0], rel=1e-12)